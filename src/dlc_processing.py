@@ -4,25 +4,31 @@ import seaborn as sns
 import matplotlib.pyplot as plt
 import re
 import os
+import csv
+import json
+import time
+import hashlib
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
 import pingouin as pg
 from pingouin import power_anova
+from table_schema import DLC_SCHEMA, apply_schema, concat_long_tables
 
+# Bump whenever dlc_to_long output changes, so cached sessions are re-parsed
+DLC_PARSER_VERSION = 2
 
-def dlc_to_long(file_path):
+
+def _parse_dlc_file_name(file_name):
     """
-    Transforms wide DLC data into a long format, using metadata rows to structure columns
-    and extracts cohort_id from the file name.
+    Extracts cohort_id and day from a DLC file name.
 
     Parameters:
-    - file_path: String representing the file path to the wide-format positional data CSV.
+    - file_name: String, base name of the DLC CSV file.
 
     Returns:
-    - long_data: DataFrame in long format with columns ['x', 'y', 'likelihood', 'body_part', 'coords', 'cohort_id'].
+    - (cohort_id, day): Tuple of strings, ("unknown", "unknown") if the name does not match.
     """
-
-    # Extract the file name from the file path
-    file_name = os.path.basename(file_path)
-
     # Attempt to match both formats
     match1 = re.match(r"(\w+)_([a-zA-Z]+\d*)_(\d+)", file_name)  # Format 1
     match2 = re.match(r"(\w+)_([a-zA-Z]+\d*)_(\d+)-(\d+)", file_name)  # Format 2
@@ -44,212 +50,810 @@ def dlc_to_long(file_path):
         cohort_id = "unknown"
         day = "unknown"
 
-    raw_data = pd.read_csv(file_path)
+    return cohort_id, day
 
-    # Extract body parts from the first metadata row and coordinate types from the second row
-    body_parts = raw_data.iloc[0, 1::3].values
-    coordinates = ["x", "y", "likelihood"]
 
-    # Generate column names using body parts and coordinates
-    column_names = [f"{body}_{coord}" for body in body_parts for coord in coordinates]
+def _read_dlc_header(file_path):
+    """
+    Reads the three DLC metadata rows (scorer, bodyparts, coords) without touching the data.
 
-    # Reload the dataset, skipping metadata rows and assigning correct column names
-    data = pd.read_csv(file_path, skiprows=[0, 1])
-    data = data.iloc[:, 1:]  # Drop the first unnecessary 'coords' column
-    data.columns = column_names
+    Parameters:
+    - file_path: String representing the file path to the wide-format positional data CSV.
 
-    # Insert 'cohort_id' and 'day' column
-    data["cohort_id"] = cohort_id
-    data["day"] = day
+    Returns:
+    - body_parts: List of body part names in column order.
+    - coordinates: List of coordinate names for the first body part (e.g. ['x', 'y', 'likelihood']).
+    """
+    with open(file_path, "r", newline="") as f:
+        header = [next(csv.reader([f.readline()])) for _ in range(3)]
 
-    # Convert to long format
-    long_data = pd.DataFrame()
-    for part in body_parts:
-        part_data = data[
-            [f"{part}_x", f"{part}_y", f"{part}_likelihood", "cohort_id", "day"]
-        ].copy()
-        part_data.columns = ["x", "y", "likelihood", "cohort_id", "day"]
-        part_data["body_part"] = part
-        part_data["index"] = part_data.index
-        part_data["t(sec)"] = (part_data["index"] / len(part_data) * 300).round(2)
-        long_data = pd.concat([long_data, part_data], ignore_index=True)
+    bodyparts_row, coords_row = header[1][1:], header[2][1:]
+    if len(bodyparts_row) % 3 != 0:
+        raise ValueError(
+            f"Unexpected DLC header in {file_path}: {len(bodyparts_row)} data columns"
+        )
 
-    return long_data
+    body_parts = bodyparts_row[::3]
+    coordinates = coords_row[:3]
+    return body_parts, coordinates
 
 
-def process_dlc_folder(folder_path):
+def dlc_to_long(file_path, keep_float64=False):
     """
-    Processes all relevant DLC CSV files in a folder, converts them to long format, and
-    concatenates them into a single DataFrame.
+    Transforms wide DLC data into a long format, using metadata rows to structure columns
+    and extracts cohort_id from the file name.
+
+    The header is parsed once and the coordinate block is reshaped in a single NumPy
+    operation, so no per-body-part copies are made. Columns follow DLC_SCHEMA:
+    categorical 'body_part', 'cohort_id' and 'day', float32 coordinates.
+
+    Parameters:
+    - file_path: String representing the file path to the wide-format positional data CSV.
+    - keep_float64: If True, 'x', 'y' and 'likelihood' stay float64.
+
+    Returns:
+    - long_data: DataFrame in long format with columns
+      ['x', 'y', 'likelihood', 'cohort_id', 'day', 'body_part', 'index', 't(sec)'].
+    """
+
+    # Extract the file name from the file path
+    file_name = os.path.basename(file_path)
+    cohort_id, day = _parse_dlc_file_name(file_name)
+
+    # Body parts from the first metadata row, coordinate types from the second row
+    body_parts, coordinates = _read_dlc_header(file_path)
+    if coordinates != ["x", "y", "likelihood"]:
+        raise ValueError(
+            f"Unexpected DLC coordinate columns in {file_name}: {coordinates}"
+        )
+
+    # Load the coordinate block only, dropping the first frame index column
+    values = pd.read_csv(
+        file_path,
+        skiprows=3,
+        header=None,
+        usecols=range(1, 3 * len(body_parts) + 1),
+        dtype=np.float64 if keep_float64 else np.float32,
+    ).to_numpy()
+
+    n_frames = values.shape[0]
+    n_parts = len(body_parts)
+
+    # (frames, parts, 3) -> (parts, frames, 3) -> (parts * frames, 3), body part major
+    coords = values.reshape(n_frames, n_parts, 3).transpose(1, 0, 2).reshape(-1, 3)
+
+    frame_index = np.tile(np.arange(n_frames, dtype=np.int32), n_parts)
+    n_rows = n_frames * n_parts
+
+    long_data = pd.DataFrame(
+        {
+            "x": coords[:, 0],
+            "y": coords[:, 1],
+            "likelihood": coords[:, 2],
+            "cohort_id": pd.Categorical.from_codes(
+                np.zeros(n_rows, dtype=np.int8), categories=[cohort_id]
+            ),
+            "day": pd.Categorical.from_codes(
+                np.zeros(n_rows, dtype=np.int8), categories=[day]
+            ),
+            "body_part": pd.Categorical.from_codes(
+                np.repeat(np.arange(n_parts, dtype=np.int16), n_frames),
+                categories=body_parts,
+            ),
+            "index": frame_index,
+            "t(sec)": (frame_index / n_frames * 300).round(2),
+        }
+    )
+
+    return apply_schema(long_data, DLC_SCHEMA, keep_float64=keep_float64)
+
+
+def _list_dlc_files(folder_path):
+    """
+    Lists the DLC CSV files in a folder, sorted by name.
 
     Parameters:
     - folder_path: String representing the path to the folder containing DLC CSV files.
 
     Returns:
-    - combined_data: DataFrame containing all processed data in long format.
+    - dlc_files: List of file names ending in '.csv' and containing 'DLC'.
     """
-    combined_data = pd.DataFrame()
+    return sorted(
+        f for f in os.listdir(folder_path) if f.endswith(".csv") and "DLC" in f
+    )
 
-    # List all files in the folder
-    all_files = os.listdir(folder_path)
 
-    # Filter for relevant DLC CSV files
-    dlc_files = [f for f in all_files if f.endswith(".csv") and "DLC" in f]
+def _dlc_to_long_safe(file_path, keep_float64=False):
+    """
+    Runs dlc_to_long on one file and captures any exception, so that a single bad file
+    does not abort a worker pool.
 
-    successful_count = 0
+    Returns:
+    - (long_data, error): long_data is None and error is a string if parsing failed.
+    """
+    try:
+        return dlc_to_long(file_path, keep_float64=keep_float64), None
+    except Exception as e:
+        return None, f"{type(e).__name__}: {e}"
 
-    # Process each file
-    for file_name in dlc_files:
-        file_path = os.path.join(folder_path, file_name)
-        # Process the file using dlc_to_long
-        try:
-            long_data = dlc_to_long(file_path)
-            combined_data = pd.concat([combined_data, long_data], ignore_index=True)
-            successful_count += 1
-        except Exception as e:
-            print(f"Error processing {file_name}: {e}")
-            continue
 
-    print(f"Successfully processed {successful_count} files.")
+def _map_files(func, file_paths, n_jobs=1, max_pending=None):
+    """
+    Applies `func` to each file path, optionally in a process pool, yielding results in
+    input order while keeping at most `max_pending` files in flight.
 
-    return combined_data
+    Parameters:
+    - func: Picklable function taking a single file path.
+    - file_paths: List of file paths.
+    - n_jobs: Number of worker processes (default: 1, in-process). None uses all cores.
+    - max_pending: Maximum number of files in flight (default: 2 * n_jobs).
+
+    Yields:
+    - (file_path, result) tuples.
+    """
+    if n_jobs is None:
+        n_jobs = os.cpu_count() or 1
+
+    if n_jobs <= 1:
+        for file_path in file_paths:
+            yield file_path, func(file_path)
+        return
+
+    if max_pending is None:
+        max_pending = 2 * n_jobs
+
+    with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+        pending = deque()
+
+        # Keep a bounded window of submitted files and yield them in input order
+        for file_path in file_paths:
+            pending.append((file_path, executor.submit(func, file_path)))
+            if len(pending) >= max_pending:
+                done_path, future = pending.popleft()
+                yield done_path, future.result()
+
+        while pending:
+            done_path, future = pending.popleft()
+            yield done_path, future.result()
 
 
-def check_dlc_shapes(folder_path):
+def iter_dlc_folder(folder_path, n_jobs=1, max_pending=None, keep_float64=False):
     """
-    Checks all relevant DLC CSV files in a folder for the expected shape of (1124, 8).
-    If a file does not match this shape, prints the file name and its shape.
+    Lazily converts every DLC CSV in a folder to long format, optionally spreading the
+    work over a process pool.
+
+    At most `max_pending` files are parsed ahead of the consumer, so memory stays
+    bounded no matter how many files the folder holds.
 
     Parameters:
     - folder_path: String representing the path to the folder containing DLC CSV files.
+    - n_jobs: Number of worker processes (default: 1, in-process). None uses all cores.
+    - max_pending: Maximum number of files in flight (default: 2 * n_jobs).
+    - keep_float64: If True, coordinates stay float64 (see dlc_to_long).
+
+    Yields:
+    - (file_name, long_data, error): long_data is None and error is a string if the
+      file could not be processed, otherwise error is None.
+    """
+    file_paths = [os.path.join(folder_path, f) for f in _list_dlc_files(folder_path)]
+
+    parse = partial(_dlc_to_long_safe, keep_float64=keep_float64)
+    for file_path, (long_data, error) in _map_files(
+        parse, file_paths, n_jobs=n_jobs, max_pending=max_pending
+    ):
+        yield os.path.basename(file_path), long_data, error
+
+
+class DLCCache:
+    """
+    On-disk Parquet cache of parsed DLC sessions.
+
+    Each source CSV is stored as one Parquet file. An entry is valid as long as the
+    source path, size, modification time and DLC_PARSER_VERSION all match, so only new
+    or changed files are re-parsed. When `max_bytes` is set, least recently used
+    entries are evicted to keep the cache under that size.
     """
-    # List all files in the folder
-    all_files = os.listdir(folder_path)
 
-    # Filter for relevant DLC CSV files
-    dlc_files = [f for f in all_files if f.endswith(".csv") and "DLC" in f]
+    def __init__(self, cache_dir, max_bytes=None, keep_float64=False):
+        """
+        Parameters:
+        - cache_dir: Directory holding the Parquet files and the 'index.json' manifest.
+        - max_bytes: Optional size cap for the cache directory, in bytes.
+        - keep_float64: If True, sessions are parsed and stored with float64 coordinates.
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.keep_float64 = keep_float64
+        self.index_path = os.path.join(cache_dir, "index.json")
+        os.makedirs(cache_dir, exist_ok=True)
+        self.index = self._load_index()
+
+    def _load_index(self):
+        if not os.path.exists(self.index_path):
+            return {}
+        with open(self.index_path, "r") as f:
+            return json.load(f)
+
+    def _save_index(self):
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.index, f, indent=1)
+        os.replace(tmp_path, self.index_path)
+
+    def _source_signature(self, file_path):
+        stat = os.stat(file_path)
+        return {
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "parser_version": DLC_PARSER_VERSION,
+            "keep_float64": self.keep_float64,
+        }
+
+    @staticmethod
+    def _entry_key(file_path):
+        return hashlib.sha1(file_path.encode("utf-8")).hexdigest()
 
-    successful_count = 0
-    outlier_files = []
+    def _entry_path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.parquet")
+
+    def _is_fresh(self, file_path):
+        """Checks whether the cache holds an up-to-date entry for a source file."""
+        entry = self.index.get(file_path)
+        return (
+            entry is not None
+            and entry["signature"] == self._source_signature(file_path)
+            and os.path.exists(self._entry_path(entry["key"]))
+        )
+
+    def _read(self, file_path):
+        entry = self.index[file_path]
+        entry["last_access"] = time.time()
+        return pd.read_parquet(self._entry_path(entry["key"]))
+
+    def _store(self, file_path, long_data):
+        key = self._entry_key(file_path)
+        entry_path = self._entry_path(key)
+        long_data.to_parquet(entry_path, index=False)
+        self.index[file_path] = {
+            "key": key,
+            "signature": self._source_signature(file_path),
+            "nbytes": os.path.getsize(entry_path),
+            "last_access": time.time(),
+        }
+
+    def load(self, file_path):
+        """
+        Returns dlc_to_long(file_path), reading it from the cache when the source is
+        unchanged and parsing (and caching) it otherwise.
+        """
+        file_path = os.path.abspath(file_path)
+        if self._is_fresh(file_path):
+            long_data = self._read(file_path)
+        else:
+            long_data = dlc_to_long(file_path, keep_float64=self.keep_float64)
+            self._store(file_path, long_data)
+            self.evict()
+        self._save_index()
+        return long_data
+
+    def iter_folder(self, folder_path, n_jobs=1, max_pending=None):
+        """
+        Same contract as iter_dlc_folder, but cached sessions are read from disk and
+        only new or changed files are sent to the parser pool.
+
+        Yields:
+        - (file_name, long_data, error) tuples, in folder order.
+        """
+        file_paths = [
+            os.path.abspath(os.path.join(folder_path, f))
+            for f in _list_dlc_files(folder_path)
+        ]
+        stale = [p for p in file_paths if not self._is_fresh(p)]
+        stale_set = set(stale)
+        parse = partial(_dlc_to_long_safe, keep_float64=self.keep_float64)
+        parsed = _map_files(parse, stale, n_jobs=n_jobs, max_pending=max_pending)
 
-    # Process each file
-    for file_name in dlc_files:
-        file_path = os.path.join(folder_path, file_name)
         try:
-            long_data = dlc_to_long(file_path)
-            if long_data.shape == (13488, 8):
-                successful_count += 1
-            else:
-                outlier_files.append((file_name, long_data.shape))
-        except Exception as e:
-            print(f"Error processing {file_name}: {e}")
-            continue
+            for file_path in file_paths:
+                if file_path in stale_set:
+                    _, (long_data, error) = next(parsed)
+                    if error is None:
+                        self._store(file_path, long_data)
+                else:
+                    long_data, error = self._read(file_path), None
+                yield os.path.basename(file_path), long_data, error
+        finally:
+            # Evict only once the whole folder has been served, so entries needed
+            # later in this pass are not removed underneath it
+            parsed.close()
+            self.evict()
+            self._save_index()
+
+    def evict(self):
+        """
+        Removes least recently used entries until the cache fits in `max_bytes`.
+        """
+        if self.max_bytes is None:
+            return
+
+        total = sum(entry["nbytes"] for entry in self.index.values())
+        by_age = sorted(self.index.items(), key=lambda item: item[1]["last_access"])
+        for file_path, entry in by_age:
+            if total <= self.max_bytes:
+                break
+            entry_path = self._entry_path(entry["key"])
+            if os.path.exists(entry_path):
+                os.remove(entry_path)
+            total -= entry["nbytes"]
+            del self.index[file_path]
+
+    def clear(self):
+        """
+        Deletes every cached session.
+        """
+        for entry in self.index.values():
+            entry_path = self._entry_path(entry["key"])
+            if os.path.exists(entry_path):
+                os.remove(entry_path)
+        self.index = {}
+        self._save_index()
+
+
+def process_dlc_folder(
+    folder_path, n_jobs=1, return_errors=False, cache=None, keep_float64=False
+):
+    """
+    Processes all relevant DLC CSV files in a folder, converts them to long format, and
+    concatenates them into a single DataFrame.
+
+    Files are parsed by iter_dlc_folder (optionally in parallel) and concatenated once at
+    the end, instead of growing the result file by file.
+
+    Parameters:
+    - folder_path: String representing the path to the folder containing DLC CSV files.
+    - n_jobs: Number of worker processes (default: 1). None uses all cores.
+    - return_errors: If True, also return a DataFrame of files that failed.
+    - cache: Optional DLCCache; unchanged files are then read from the cache (its own
+      keep_float64 setting applies).
+    - keep_float64: If True, coordinates stay float64 (see dlc_to_long).
+
+    Returns:
+    - combined_data: DataFrame containing all processed data in long format.
+    - errors (only if return_errors=True): DataFrame with columns ['file_name', 'error'].
+    """
+    frames = []
+    errors = []
+
+    if cache is not None:
+        sessions = cache.iter_folder(folder_path, n_jobs=n_jobs)
+    else:
+        sessions = iter_dlc_folder(
+            folder_path, n_jobs=n_jobs, keep_float64=keep_float64
+        )
+
+    for file_name, long_data, error in sessions:
+        if error is not None:
+            print(f"Error processing {file_name}: {error}")
+            errors.append({"file_name": file_name, "error": error})
+        else:
+            frames.append(long_data)
+
+    combined_data = concat_long_tables(frames)
+    errors = pd.DataFrame(errors, columns=["file_name", "error"])
+
+    print(f"Successfully processed {len(frames)} files, {len(errors)} failed.")
+
+    if return_errors:
+        return combined_data, errors
+    return combined_data
+
+
+def _count_data_lines(file_path, header_rows=3, chunk_size=1 << 20):
+    """
+    Counts the data rows of a CSV by streaming raw bytes, without parsing.
+    """
+    n_lines = 0
+    last_byte = b"\n"
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            n_lines += chunk.count(b"\n")
+            last_byte = chunk[-1:]
+    if last_byte != b"\n":
+        n_lines += 1  # last line without a trailing newline
+    return max(n_lines - header_rows, 0)
+
+
+def _dlc_file_summary(file_path):
+    """
+    Reads only the header of a DLC CSV and counts its frames.
+
+    Returns:
+    - dict with 'file_name', 'n_frames', 'body_parts' and 'error'.
+    """
+    summary = {
+        "file_name": os.path.basename(file_path),
+        "n_frames": None,
+        "body_parts": None,
+        "error": None,
+    }
+    try:
+        summary["body_parts"], _ = _read_dlc_header(file_path)
+        summary["n_frames"] = _count_data_lines(file_path)
+    except Exception as e:
+        summary["error"] = f"{type(e).__name__}: {e}"
+    return summary
+
+
+def check_dlc_shapes(
+    folder_path,
+    expected_frames=1124,
+    expected_n_parts=12,
+    expected_body_parts=None,
+    n_jobs=1,
+):
+    """
+    Checks all relevant DLC CSV files in a folder for the expected number of frames and
+    body parts. If a file does not match, prints the file name and the mismatch.
+
+    Only the header rows are parsed and data rows are counted from the raw bytes, so no
+    file goes through dlc_to_long.
+
+    Parameters:
+    - folder_path: String representing the path to the folder containing DLC CSV files.
+    - expected_frames: Expected number of frames per file (default: 1124).
+    - expected_n_parts: Expected number of body parts per file (default: 12).
+    - expected_body_parts: Optional ordered list of body part names each file must have.
+    - n_jobs: Number of worker processes (default: 1). None uses all cores.
+
+    Returns:
+    - summary_df: DataFrame with one row per file and columns
+      ['file_name', 'n_frames', 'n_parts', 'body_parts', 'error', 'ok'].
+    """
+    file_paths = [os.path.join(folder_path, f) for f in _list_dlc_files(folder_path)]
+    summaries = [
+        summary for _, summary in _map_files(_dlc_file_summary, file_paths, n_jobs)
+    ]
+    summary_df = pd.DataFrame(
+        summaries, columns=["file_name", "n_frames", "body_parts", "error"]
+    )
+    summary_df.insert(
+        2,
+        "n_parts",
+        [None if parts is None else len(parts) for parts in summary_df["body_parts"]],
+    )
+
+    ok = (
+        summary_df["error"].isna()
+        & (summary_df["n_frames"] == expected_frames)
+        & (summary_df["n_parts"] == expected_n_parts)
+    )
+    if expected_body_parts is not None:
+        ok &= summary_df["body_parts"].apply(
+            lambda parts: parts is not None and list(parts) == list(expected_body_parts)
+        )
+    summary_df["ok"] = ok
 
     print(
-        f"Successfully processed {successful_count} files with the expected shape (1124, 8)."
+        f"Successfully checked {int(ok.sum())} files with the expected shape "
+        f"({expected_frames} frames, {expected_n_parts} body parts)."
     )
-    if outlier_files:
+    outliers = summary_df[~ok]
+    if not outliers.empty:
         print("Files with unexpected shapes:")
-        for file_name, shape in outlier_files:
-            print(f"  - {file_name}: {shape}")
+        for _, row in outliers.iterrows():
+            if row["error"] is not None:
+                print(f"  - {row['file_name']}: {row['error']}")
+            else:
+                print(
+                    f"  - {row['file_name']}: {row['n_frames']} frames, "
+                    f"{row['n_parts']} body parts"
+                )
     else:
         print("All files have the expected shape.")
 
+    return summary_df
+
+
+def build_keypoint_tensor(
+    df,
+    body_parts,
+    group_cols=("cohort_id", "day"),
+    likelihood_threshold=None,
+    frame_cols=(),
+    return_present=False,
+):
+    """
+    Pivots a long-format DLC table into a dense keypoint array.
+
+    Frames are identified by `group_cols` plus 't(sec)', so a whole cohort's long
+    table (many cohort_id/day sessions) is handled in one call. Body parts missing in
+    a frame are NaN.
+
+    Parameters:
+    - df: DataFrame containing columns ['x', 'y', 'body_part', 't(sec)'] plus any of
+      `group_cols` that are present.
+    - body_parts: Ordered list of keypoints to place along the second axis.
+    - group_cols: Session identifier columns (default: ('cohort_id', 'day')).
+    - likelihood_threshold: If given, keypoints with 'likelihood' below it are set to NaN.
+    - frame_cols: Extra per-frame columns (e.g. 'index') copied into `frames`.
+    - return_present: If True, also return which keypoints have a row in `df`.
+
+    Returns:
+    - frames: DataFrame with one row per frame, holding the session columns, 't(sec)'
+      and `frame_cols`.
+    - coords: Float array of shape (n_frames, n_parts, 2) with (x, y) per keypoint.
+    - present (only if return_present=True): Boolean array of shape (n_frames, n_parts),
+      False where a keypoint has no row, as opposed to a row with NaN coordinates.
+    """
+    key_cols = [col for col in group_cols if col in df.columns] + ["t(sec)"]
+
+    # Frames are numbered on the full table, so a frame where none of `body_parts`
+    # was tracked is kept (with NaN coordinates)
+    all_frame_codes = df.groupby(key_cols, sort=True, observed=True).ngroup().to_numpy()
+    n_frames = all_frame_codes.max() + 1 if len(all_frame_codes) else 0
+
+    # Position of each row's body part in `body_parts`, -1 if not requested
+    part_codes = pd.Categorical(df["body_part"], categories=body_parts).codes
+    keep = (part_codes >= 0) & (all_frame_codes >= 0)
+    data = df.loc[keep, ["x", "y"]]
+    part_codes = part_codes[keep]
+    frame_codes = all_frame_codes[keep]
+
+    coords = np.full((n_frames, len(body_parts), 2), np.nan)
+    coords[frame_codes, part_codes] = data[["x", "y"]].to_numpy(dtype=np.float64)
+
+    if likelihood_threshold is not None:
+        low_confidence = df["likelihood"].to_numpy()[keep] < likelihood_threshold
+        coords[frame_codes[low_confidence], part_codes[low_confidence]] = np.nan
+
+    codes, first_rows = np.unique(all_frame_codes, return_index=True)
+    first_rows = first_rows[codes >= 0]
+    frames = df[key_cols + list(frame_cols)].iloc[first_rows].reset_index(drop=True)
+
+    if return_present:
+        present = np.zeros((n_frames, len(body_parts)), dtype=bool)
+        present[frame_codes, part_codes] = True
+        return frames, coords, present
+    return frames, coords
+
+
+def _total_length(coords, present=None):
+    """
+    Sum of consecutive segment lengths per frame. A NaN coordinate makes the frame NaN;
+    if `present` is given, segments with a keypoint that has no row contribute 0.
+    """
+    segments = np.diff(coords, axis=1)
+    lengths = np.hypot(segments[..., 0], segments[..., 1])
+    if present is not None:
+        lengths = np.where(present[:, :-1] & present[:, 1:], lengths, 0.0)
+    return lengths.sum(axis=1)
+
 
 def compute_body_length(df, body_parts):
     """
     Computes body length by summing Euclidean distances between consecutive keypoints along the spine.
 
+    All frames of all (cohort_id, day) sessions are processed at once on the keypoint
+    array from build_keypoint_tensor. As in the per-frame loop, segments with a
+    keypoint that has no row contribute 0, while NaN coordinates make the length NaN.
+
     Parameters:
     - df: DataFrame containing columns ['x', 'y', 'body_part', 'cohort_id', 'day', 't(sec)']
     - body_parts: List of keypoints defining the body axis, ordered from head to tail.
 
     Returns:
-    - length_df: DataFrame containing body length per frame.
+    - length_df: DataFrame containing body length per frame, with 'cohort_id' and 'day'
+      when present in `df`.
     """
-    length_list = []
+    length_df, coords, present = build_keypoint_tensor(
+        df, body_parts, return_present=True
+    )
 
-    for t in df["t(sec)"].unique():
-        frame_data = df[df["t(sec)"] == t].set_index("body_part")
+    length_df["body_length"] = _total_length(coords, present)
 
-        length = 0
-        for i in range(len(body_parts) - 1):
-            p1, p2 = body_parts[i], body_parts[i + 1]
+    return length_df
 
-            if p1 in frame_data.index and p2 in frame_data.index:
-                coords1 = frame_data.loc[p1, ["x", "y"]].values
-                coords2 = frame_data.loc[p2, ["x", "y"]].values
 
-                if coords1.shape[0] == 2:  # Ensure only two values (x, y) are retrieved
-                    x1, y1 = coords1
-                    x2, y2 = coords2
-                    length += np.sqrt((x2 - x1) ** 2 + (y2 - y1) ** 2)
-                else:
-                    print(
-                        f"Warning: Unexpected shape {coords1.shape} for {p1} at time {t}"
-                    )
+def _spine_angles(coords):
+    """
+    Angles (radians) between consecutive spine segments for every frame.
 
-        length_list.append({"t(sec)": t, "body_length": length})
+    Parameters:
+    - coords: Array of shape (n_frames, n_parts, 2).
 
-    length_df = pd.DataFrame(length_list)
-    return length_df
+    Returns:
+    - Array of shape (n_frames, n_parts - 2); NaN where a keypoint is missing, 0 where
+      a segment has zero length.
+    """
+    segments = np.diff(coords, axis=1)
+    v1, v2 = segments[:, :-1], segments[:, 1:]
+
+    dot_product = np.sum(v1 * v2, axis=-1)
+    norm_product = np.hypot(v1[..., 0], v1[..., 1]) * np.hypot(v2[..., 0], v2[..., 1])
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        cos_theta = np.clip(dot_product / norm_product, -1.0, 1.0)
+    angles = np.where(norm_product > 0, np.arccos(cos_theta), 0.0)
+    return np.where(np.isnan(norm_product), np.nan, angles)
+
+
+def _total_curvature(coords):
+    """
+    Sum of spine angles per frame, NaN if no angle could be computed.
+    """
+    angles = _spine_angles(coords)
+    curvature = np.nansum(angles, axis=1)
+    curvature[np.isnan(angles).all(axis=1)] = np.nan
+    return curvature
 
 
-def compute_spine_curvature(df, body_parts):
+def compute_spine_curvature(df, body_parts, likelihood_threshold=None):
     """
     Computes spine curvature by summing angles between consecutive spine segments.
 
+    All frames of all (cohort_id, day) sessions are processed at once. Angles that
+    involve a missing or masked keypoint are skipped in the sum; frames without any
+    valid angle are NaN.
+
     Parameters:
     - df: DataFrame with columns ['x', 'y', 'body_part', 'cohort_id', 'day', 't(sec)']
     - body_parts: Ordered list of keypoints defining the spine.
+    - likelihood_threshold: Optional; keypoints with 'likelihood' below it are masked.
 
     Returns:
-    - curvature_df: DataFrame containing spine curvature per frame.
+    - curvature_df: DataFrame containing spine curvature per frame, with 'cohort_id'
+      and 'day' when present in `df`.
     """
-    curvature_list = []
-
-    for t in df["t(sec)"].unique():
-        frame_data = df[df["t(sec)"] == t].set_index("body_part")
-
-        angles = []
-        missing_parts = []
+    curvature_df, coords = build_keypoint_tensor(
+        df, body_parts, likelihood_threshold=likelihood_threshold
+    )
 
-        for i in range(len(body_parts) - 2):
-            p1, p2, p3 = body_parts[i], body_parts[i + 1], body_parts[i + 2]
+    curvature_df["spine_curvature"] = _total_curvature(coords)
 
-            if (
-                p1 in frame_data.index
-                and p2 in frame_data.index
-                and p3 in frame_data.index
-            ):
-                x1, y1 = frame_data.loc[p1, ["x", "y"]].values
-                x2, y2 = frame_data.loc[p2, ["x", "y"]].values
-                x3, y3 = frame_data.loc[p3, ["x", "y"]].values
+    return curvature_df
 
-                v1 = np.array([x2 - x1, y2 - y1])
-                v2 = np.array([x3 - x2, y3 - y2])
 
-                dot_product = np.dot(v1, v2)
-                norm_product = np.linalg.norm(v1) * np.linalg.norm(v2)
+def _session_starts(frames, group_cols=("cohort_id", "day")):
+    """
+    Boolean array marking the first frame of each session in a frame table sorted by
+    session, as returned by build_keypoint_tensor.
+    """
+    session_cols = [col for col in group_cols if col in frames.columns]
+    if not session_cols:
+        return np.arange(len(frames)) == 0
+    codes = frames.groupby(session_cols, sort=False, observed=True).ngroup()
+    return np.r_[True, np.diff(codes.to_numpy()) != 0][: len(frames)]
 
-                if norm_product > 0:
-                    theta = np.arccos(dot_product / norm_product)
-                    angles.append(theta)
-                else:
-                    angles.append(0)
-            else:
-                missing_parts.append((p1, p2, p3))
 
-        if missing_parts:
-            print(f"Missing keypoints at time {t}: {missing_parts}")
+def _session_diff(values, starts):
+    """
+    First difference along axis 0 that is NaN at the first frame of every session, so
+    differences never span two sessions.
+    """
+    diff = np.empty_like(values, dtype=np.float64)
+    diff[0] = np.nan
+    diff[1:] = values[1:] - values[:-1]
+    diff[starts] = np.nan
+    return diff
+
+
+def extract_kinematic_features(
+    df,
+    body_parts,
+    centroid_parts=None,
+    likelihood_threshold=None,
+    bin_size=None,
+    frame_rate=None,
+):
+    """
+    Computes per-frame kinematic features for every (cohort_id, day) session from a single
+    keypoint tensor, instead of rescanning the long table once per metric.
+
+    Features:
+    - body_length: summed length of consecutive `body_parts` segments; NaN when any of
+      them is missing or masked.
+    - spine_curvature: summed angle (rad) between consecutive segments.
+    - centroid_x, centroid_y: mean position of `centroid_parts`.
+    - speed: centroid speed (pixels/s); acceleration: change in speed (pixels/s^2).
+    - heading: direction (rad) of the vector from the last to the first of `body_parts`
+      (tail to head); angular_velocity: unwrapped change in heading (rad/s).
 
-        # Sum all angles for total curvature
-        total_curvature = np.sum(angles)
+    Parameters:
+    - df: DataFrame with columns ['x', 'y', 'likelihood', 'body_part', 'cohort_id', 'day', 't(sec)']
+    - body_parts: Ordered list of keypoints defining the spine, head to tail.
+    - centroid_parts: Keypoints averaged for the centroid (default: `body_parts`).
+    - likelihood_threshold: Optional; keypoints with 'likelihood' below it are masked.
+    - bin_size: Optional bin width in seconds. If given, features are averaged into
+      fixed time bins ('time_bin' = bin start), with a circular mean for heading.
+    - frame_rate: Optional frames per second for speed and angular velocity. By default
+      the time step comes from the integer 'index' column and each session's time span,
+      since 't(sec)' is rounded to 2 decimals.
 
-        curvature_list.append({"t(sec)": t, "spine_curvature": total_curvature})
+    Returns:
+    - features_df: DataFrame with one row per frame (or per bin) and the columns above.
+    """
+    if centroid_parts is None:
+        centroid_parts = list(body_parts)
+
+    all_parts = list(dict.fromkeys(list(body_parts) + list(centroid_parts)))
+    frame_cols = ["index"] if "index" in df.columns else []
+    features_df, coords = build_keypoint_tensor(
+        df,
+        all_parts,
+        likelihood_threshold=likelihood_threshold,
+        frame_cols=frame_cols,
+    )
+    spine = coords[:, [all_parts.index(p) for p in body_parts]]
+    centroid_coords = coords[:, [all_parts.index(p) for p in centroid_parts]]
+
+    features_df["body_length"] = _total_length(spine)
+    features_df["spine_curvature"] = _total_curvature(spine)
+
+    with np.errstate(invalid="ignore"):
+        # All-NaN frames stay NaN without a RuntimeWarning per frame
+        centroid = np.full((len(coords), 2), np.nan)
+        valid = ~np.isnan(centroid_coords).all(axis=(1, 2))
+        centroid[valid] = np.nanmean(centroid_coords[valid], axis=1)
+    features_df["centroid_x"] = centroid[:, 0]
+    features_df["centroid_y"] = centroid[:, 1]
+
+    starts = _session_starts(features_df)
+    times = features_df["t(sec)"].to_numpy(dtype=np.float64)
+    if frame_cols:
+        # Exact step from frame numbers: seconds per frame is each session's time span
+        # over its frame span, which the 2-decimal rounding of 't(sec)' barely affects
+        frame_index = features_df.pop("index").to_numpy(dtype=np.float64)
+        frame_steps = _session_diff(frame_index, starts)
+        if frame_rate is not None:
+            seconds_per_frame = 1.0 / frame_rate
+        else:
+            session = np.cumsum(starts) - 1
+            ends = np.r_[np.flatnonzero(starts)[1:], len(starts)] - 1
+            first = np.flatnonzero(starts)
+            with np.errstate(invalid="ignore", divide="ignore"):
+                seconds_per_frame = (
+                    (times[ends] - times[first])
+                    / (frame_index[ends] - frame_index[first])
+                )[session]
+        dt = frame_steps * seconds_per_frame
+    else:
+        dt = _session_diff(times, starts)
+        if frame_rate is not None:
+            dt = np.round(dt * frame_rate) / frame_rate
+    dt[~(dt > 0)] = np.nan
+
+    displacement = _session_diff(centroid, starts)
+    speed = np.hypot(displacement[:, 0], displacement[:, 1]) / dt
+    features_df["speed"] = speed
+    features_df["acceleration"] = _session_diff(speed, starts) / dt
+
+    heading_vector = spine[:, 0] - spine[:, -1]
+    heading = np.arctan2(heading_vector[:, 1], heading_vector[:, 0])
+    features_df["heading"] = heading
+    # Wrap heading changes into [-pi, pi) before dividing by dt
+    heading_change = (_session_diff(heading, starts) + np.pi) % (2 * np.pi) - np.pi
+    features_df["angular_velocity"] = heading_change / dt
+
+    if bin_size is None:
+        return features_df
+
+    session_cols = [col for col in ("cohort_id", "day") if col in features_df.columns]
+    features_df["time_bin"] = np.floor(features_df["t(sec)"] / bin_size) * bin_size
+    features_df["heading_sin"] = np.sin(features_df["heading"])
+    features_df["heading_cos"] = np.cos(features_df["heading"])
+
+    binned_df = (
+        features_df.drop(columns=["t(sec)", "heading"])
+        .groupby(session_cols + ["time_bin"], observed=True, sort=True)
+        .mean()
+        .reset_index()
+    )
+    binned_df["heading"] = np.arctan2(
+        binned_df["heading_sin"], binned_df["heading_cos"]
+    )
+    binned_df = binned_df.drop(columns=["heading_sin", "heading_cos"])
 
-    curvature_df = pd.DataFrame(curvature_list)
-    return curvature_df
+    return binned_df
 
 
 def plot_kinematics_pointplot(bouts_df, group_cols, x_col="day", y_col="body_length"):
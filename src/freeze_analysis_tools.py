@@ -1,119 +1,193 @@
+import os
+import json
+import hashlib
 import pandas as pd
 import numpy as np
 import seaborn as sns
 import matplotlib.pyplot as plt
+from table_schema import FREEZE_SCHEMA, apply_schema, concat_long_tables
 
+SESSION_COLS = ["cohort_id", "day"]
 
-def find_freeze_transitions(freeze_frame_data):
+# Per-animal metadata carried over to bout and interval tables
+PRESERVE_COLS = ["condition", "sex", "young", "age"]
+
+
+def find_freeze_transitions(freeze_frame_data, min_bout_duration=None, time_col="time"):
     """
     Identifies the timestamps where the 'freeze' in the freezeframe transitions:
     - From 1 to 0 (offset, end of a freeze period)
     - From 0 to 1 (onset, start of a freeze period)
 
+    Transitions are detected within each (cohort_id, day) session, so the end of one
+    session and the start of the next never produce a spurious onset or offset.
+
     Parameters:
     - freeze_frame_data: freeze frame DataFrame with a 'freeze' column
+    - min_bout_duration: Optional, in seconds. Onsets and offsets of freezing bouts
+      shorter than this are dropped.
+    - time_col: Name of the time column (default: 'time').
 
     Returns:
-    - A DataFrame with columns ['t(sec)', 'transition_type', 'cohort_id', 'day'],
-      sorted by 'cohort_id', 'day', and 't(sec)' (if available).
+    - A DataFrame with columns [time_col, 'transition_type', 'cohort_id', 'day'],
+      sorted by 'cohort_id', 'day', and time_col (if available).
     """
 
     if "freeze" not in freeze_frame_data.columns:
         raise ValueError('Input DataFrame does not contain a "freeze" column')
 
-    df = freeze_frame_data.copy()
-
-    df["freeze_shifted"] = df["freeze"].shift(1, fill_value=0)
-
-    offset_transitions = df[(df["freeze_shifted"] == 1) & (df["freeze"] == 0)][
-        ["time"]
-    ].copy()
-    offset_transitions["transition_type"] = "offset"
+    session_cols = [col for col in SESSION_COLS if col in freeze_frame_data.columns]
+    data, session_starts = _sort_freeze_sessions(
+        freeze_frame_data[session_cols + [time_col, "freeze"]],
+        time_col=time_col,
+        session_cols=session_cols,
+    )
+    state = _freeze_state(data["freeze"].to_numpy(), session_starts)
+    onsets, ends = _freeze_run_bounds(state, session_starts)
 
-    onset_transitions = df[(df["freeze_shifted"] == 0) & (df["freeze"] == 1)][
-        ["time"]
-    ].copy()
-    onset_transitions["transition_type"] = "onset"
+    times = data[time_col].to_numpy()
+    if min_bout_duration is not None:
+        keep = times[ends] - times[onsets] >= min_bout_duration
+        onsets, ends = onsets[keep], ends[keep]
 
-    for col in ["cohort_id", "day"]:
-        if col in freeze_frame_data.columns:
-            offset_transitions[col] = df.loc[offset_transitions.index, col].values
-            onset_transitions[col] = df.loc[onset_transitions.index, col].values
-        else:
-            offset_transitions[col] = None
-            onset_transitions[col] = None
+    # Bouts still open at the end of a session have no offset
+    offsets = ends[state[ends] == 0]
 
-    all_transitions = pd.concat(
-        [offset_transitions, onset_transitions], ignore_index=True
-    )
-
-    sort_columns = [
-        col for col in ["cohort_id", "day", "time"] if col in all_transitions.columns
+    positions = np.r_[onsets, offsets]
+    transition_type = np.r_[
+        np.full(len(onsets), "onset", dtype=object),
+        np.full(len(offsets), "offset", dtype=object),
     ]
-    all_transitions = all_transitions.sort_values(by=sort_columns).reset_index(
-        drop=True
+    order = np.argsort(positions, kind="stable")
+    positions, transition_type = positions[order], transition_type[order]
+
+    all_transitions = pd.DataFrame(
+        {time_col: times[positions], "transition_type": transition_type}
     )
+    for col in SESSION_COLS:
+        if col in session_cols:
+            all_transitions[col] = data[col].array[positions]
+        else:
+            all_transitions[col] = None
 
     return all_transitions
 
 
-def calculate_median_freeze_duration(freeze_frame_data):
+def calculate_median_freeze_duration(freeze_frame_data, per_session=False):
     """
     Calculates the overall median freeze duration across all mice and day
 
+    Bouts are taken from get_freeze_bouts, so every (cohort_id, day) group is handled
+    in a single linear pass.
+
     Parameters:
     - freeze_frame_data: DataFrame, containing columns:
         - 't(sec)': time in seconds
         - 'freeze': binary column indicating whether the mouse is freezing
-        - 'cohort)id': id for individual mouse
+        - 'cohort_id': id for individual mouse
         - 'day': day number for the experiment
+    - per_session: If True, also return per (cohort_id, day) medians.
 
     Returns:
     - A float, the median freeze duration across all mice and day combinations
+    - (only if per_session=True) A DataFrame with columns
+      ['cohort_id', 'day', 'bout_count', 'median_duration'].
     """
 
     required_columns = ["t(sec)", "freeze", "cohort_id", "day"]
-    if not required_columns.issubset(freeze_frame_data.columns):
+    if not set(required_columns).issubset(freeze_frame_data.columns):
         raise ValueError(
             f"Input Dataframe does not contain all required columns {required_columns}"
         )
 
-    cohort_ids = freeze_frame_data["cohort_id"].unique()
-    days = freeze_frame_data["day"].unique()
+    bouts_df = get_freeze_bouts(freeze_frame_data[required_columns])
+
+    overall_med = bouts_df["duration"].median() if not bouts_df.empty else 0
+
+    if not per_session:
+        return overall_med
+
+    session_medians = (
+        bouts_df.groupby(SESSION_COLS, observed=True, sort=True)["duration"]
+        .agg(bout_count="size", median_duration="median")
+        .reset_index()
+    )
+    return overall_med, session_medians
+
+
+def _sort_freeze_sessions(freeze_frame_data, time_col="t(sec)", session_cols=None):
+    """
+    Sorts frame-level freeze data by session and time, and marks session boundaries.
+
+    Rows with a missing session identifier are dropped, as groupby would drop them.
+    The result follows FREEZE_SCHEMA: categorical 'cohort_id' and 'day', int8 'freeze'
+    (float if it holds NaN).
+
+    Parameters:
+        freeze_frame_data (pd.DataFrame): Frame-level data.
+        time_col (str): Time column used to order frames within a session.
+        session_cols (list): Session identifier columns (default: SESSION_COLS).
+
+    Returns:
+        data (pd.DataFrame): Sorted copy of the input.
+        session_starts (np.ndarray): Boolean array, True on the first row of each session.
+    """
+    if session_cols is None:
+        session_cols = SESSION_COLS
+
+    if session_cols:
+        # Sorted group numbers; rows with a missing key get NaN
+        codes = freeze_frame_data.groupby(session_cols, sort=True, observed=True)
+        codes = codes.ngroup().to_numpy(dtype=np.float64)
+    else:
+        codes = np.zeros(len(freeze_frame_data))
 
-    all_freeze_durations = []
+    rows = np.flatnonzero(~np.isnan(codes))
+    times = freeze_frame_data[time_col].to_numpy()[rows]
+    rows = rows[np.lexsort((times, codes[rows]))]
 
-    for cohort_id in cohort_ids:
-        for day in days:
-            cohort_day_data = freeze_frame_data[
-                (freeze_frame_data["cohort_id"] == cohort_id)
-                & (freeze_frame_data["day"] == day)
-            ]
+    data = apply_schema(freeze_frame_data.iloc[rows].copy(deep=False), FREEZE_SCHEMA)
+    codes = codes[rows]
+    session_starts = np.r_[True, codes[1:] != codes[:-1]][: len(codes)]
+    return data, session_starts
 
-            if cohort_day_data.empty:
-                print(f"No data found for cohort_id: {cohort_id}, day: {day}")
-                continue
 
-            freeze_durations = []
-            is_freezing = False
+def _freeze_state(freeze, session_starts):
+    """
+    Run-length state of a freeze signal: 1 from a frame with freeze == 1 until the next
+    frame with freeze == 0, 0 otherwise. Any other value (e.g. NaN) keeps the previous
+    state, and every session starts out of a bout.
+    """
+    freeze = np.asarray(freeze, dtype=np.float64)
+    state = np.where(freeze == 1, 1.0, np.where(freeze == 0, 0.0, np.nan))
+    state[session_starts & np.isnan(state)] = 0.0
+    return pd.Series(state).ffill().to_numpy().astype(np.int8)
 
-            for _, row in cohort_day_data.iterrows():
-                if row["freeze"] == 1 and not is_freezing:
-                    is_freezing = True
-                    freeze_start = row["t(sec)"]
-                elif row["freeze"] == 0 and is_freezing:
-                    is_freezing = False
-                    freeze_end = row["t(sec)"]
-                    freeze_durations.append(freeze_end - freeze_start)
 
-            if is_freezing and freeze_start is not None:
-                freeze_end = cohort_day_data["t(sec)"].iloc[-1]
-                freeze_durations.append(freeze_end - freeze_start)
+def _freeze_run_bounds(state, session_starts):
+    """
+    Row positions where freezing bouts start and end.
+
+    A bout ends on the first non-freezing frame, or on the last frame of its session if
+    the animal is still freezing when the trial ends.
+
+    Returns:
+        onsets, ends (np.ndarray): Paired integer positions, one per bout.
+    """
+    if len(state) == 0:
+        return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp)
 
-            all_freeze_durations.extend(freeze_durations)
+    previous = np.r_[0, state[:-1]]
+    previous[session_starts] = 0
 
-    overall_med = np.median(all_freeze_durations) if all_freeze_durations else 0
-    return overall_med
+    onsets = np.flatnonzero((state == 1) & (previous == 0))
+    offsets = np.flatnonzero((state == 0) & (previous == 1))
+
+    session_ends = np.r_[np.flatnonzero(session_starts)[1:] - 1, len(state) - 1]
+    open_ends = session_ends[state[session_ends] == 1]
+
+    ends = np.sort(np.r_[offsets, open_ends])
+    return onsets, ends
 
 
 def get_freeze_bouts(freeze_frame_data):
@@ -121,6 +195,9 @@ def get_freeze_bouts(freeze_frame_data):
     Extracts individual freezing bouts from the data, preserving additional columns
     (e.g., condition, sex, young, etc.) if they exist in the input DataFrame.
 
+    Bouts are found for all (cohort_id, day) groups at once from the run-length
+    structure of the 'freeze' signal, without iterating over rows.
+
     Parameters:
         freeze_frame_data (pd.DataFrame): must contain columns:
             - 't(sec)'    : time in seconds
@@ -138,63 +215,265 @@ def get_freeze_bouts(freeze_frame_data):
           plus any additional columns (like 'condition', 'sex', 'young')
           copied from the first row in each (cohort_id, day) group.
     """
-    preserve_cols = ["condition", "sex", "young", "age"]  # Adjust as needed
-
-    bouts = []
-
-    grouped = freeze_frame_data.groupby(["cohort_id", "day"], as_index=False)
-
-    for (cohort, day), group in grouped:
-        group = group.sort_values("t(sec)")
-
-        extra_data = {}
-        for col in preserve_cols:
-            if col in group.columns:
-                extra_data[col] = group[col].iloc[0]
-
-        trial_start = group["t(sec)"].iloc[0]
-        trial_end = group["t(sec)"].iloc[-1]
-
-        in_bout = False
-        bout_start = None
-
-        # Detect freezing bouts
-        for _, row in group.iterrows():
-            if row["freeze"] == 1 and not in_bout:
-                # Start of a new bout
-                in_bout = True
-                bout_start = row["t(sec)"]
-            elif row["freeze"] == 0 and in_bout:
-                # End of the current bout
-                bout_end = row["t(sec)"]
-                bouts.append(
-                    {
-                        "cohort_id": cohort,
-                        "day": day,
-                        "bout_start": bout_start,
-                        "bout_end": bout_end,
-                        "duration": bout_end - bout_start,
-                        **extra_data,  # Include preserved metadata
-                    }
-                )
-                in_bout = False
-                bout_start = None
-
-        # If still in a bout at the end of the trial, close it
-        if in_bout:
-            bout_end = trial_end
-            bouts.append(
-                {
-                    "cohort_id": cohort,
-                    "day": day,
-                    "bout_start": bout_start,
-                    "bout_end": bout_end,
-                    "duration": bout_end - bout_start,
-                    **extra_data,
-                }
-            )
+    preserve_cols = [col for col in PRESERVE_COLS if col in freeze_frame_data.columns]
+
+    data, session_starts = _sort_freeze_sessions(freeze_frame_data)
+    state = _freeze_state(data["freeze"].to_numpy(), session_starts)
+    onsets, ends = _freeze_run_bounds(state, session_starts)
+
+    times = data["t(sec)"].to_numpy()
+
+    # Metadata is taken from the first row of the session each bout belongs to
+    session_first_row = np.maximum.accumulate(
+        np.where(session_starts, np.arange(len(data)), 0)
+    )
+    meta_rows = session_first_row[onsets]
+
+    bouts = data[SESSION_COLS].iloc[onsets].reset_index(drop=True)
+    bouts["bout_start"] = times[onsets]
+    bouts["bout_end"] = times[ends]
+    bouts["duration"] = bouts["bout_end"] - bouts["bout_start"]
+    for col in preserve_cols:
+        bouts[col] = data[col].to_numpy()[meta_rows]
+
+    return bouts
+
+
+class FreezeBoutIndex:
+    """
+    Interval index over freezing bouts for fast time-range queries.
+
+    Bouts from get_freeze_bouts are stored as start/end arrays sorted per
+    (cohort_id, day), so the freezing time and number of bouts inside any [t0, t1)
+    window are found with np.searchsorted instead of rescanning frame-level data.
+    """
+
+    def __init__(self, bouts_df):
+        """
+        Parameters:
+            bouts_df (pd.DataFrame): Output of get_freeze_bouts, with columns
+                'cohort_id', 'day', 'bout_start' and 'bout_end'.
+        """
+        bouts = bouts_df.dropna(subset=SESSION_COLS)
+        if bouts.empty:
+            # No animal froze: every query returns 0 freezing and 0 bouts
+            session_codes = np.empty(0, dtype=np.intp)
+            sessions = pd.MultiIndex.from_arrays([[], []], names=SESSION_COLS)
+        else:
+            session_codes, sessions = pd.MultiIndex.from_frame(
+                bouts[SESSION_COLS].astype(object)
+            ).factorize(sort=True)
+        self.sessions = sessions
+
+        starts = bouts["bout_start"].to_numpy(dtype=np.float64)
+        ends = bouts["bout_end"].to_numpy(dtype=np.float64)
+        order = np.lexsort((starts, session_codes))
+        session_codes = session_codes[order]
+        starts, ends = starts[order], ends[order]
+
+        # Lay sessions out one after another on a single time axis, so one sorted
+        # array per bound serves all sessions: t -> code * span + t
+        self._t_min = starts.min() if len(starts) else 0.0
+        self._t_max = ends.max() if len(ends) else 0.0
+        self._span = self._t_max - self._t_min + 1.0
+
+        offset = session_codes * self._span
+        self._starts = starts + offset
+        self._ends = ends + offset
+        self._cum_duration = np.r_[0.0, np.cumsum(ends - starts)]
+
+    def query(self, windows):
+        """
+        Freezing time and bout counts for many windows at once.
+
+        Parameters:
+            windows (pd.DataFrame): Columns 'cohort_id', 'day', 't0' and 't1'.
+
+        Returns:
+            pd.DataFrame: `windows` with added columns 'freeze_time' (seconds of
+            freezing inside [t0, t1)) and 'bout_count' (bouts overlapping the window).
+            Sessions without any bout get 0 for both.
+        """
+        codes = self.sessions.get_indexer(
+            pd.MultiIndex.from_frame(windows[SESSION_COLS].astype(object))
+        )
+        known = codes >= 0
+        if not len(self._starts):
+            result = windows.copy()
+            result["freeze_time"] = 0.0
+            result["bout_count"] = 0
+            return result
+
+        # Clipping to the indexed time range keeps each window inside its session;
+        # inverted windows (t1 < t0) are treated as empty
+        t0 = np.clip(windows["t0"].to_numpy(dtype=np.float64), self._t_min, self._t_max)
+        t1 = np.clip(windows["t1"].to_numpy(dtype=np.float64), self._t_min, self._t_max)
+        t1 = np.maximum(t1, t0)
+        offset = np.where(known, codes, 0) * self._span
+        t0, t1 = t0 + offset, t1 + offset
+
+        # Bouts [first, last) are those ending after t0 and starting before t1
+        first = np.searchsorted(self._ends, t0, side="right")
+        last = np.searchsorted(self._starts, t1, side="left")
+        bout_count = np.where(known & (t1 > t0), np.maximum(last - first, 0), 0)
+        has_bouts = bout_count > 0
+
+        freeze_time = self._cum_duration[last] - self._cum_duration[first]
+        first_c = np.minimum(first, len(self._starts) - 1)
+        last_c = np.maximum(last - 1, 0)
+        freeze_time = (
+            freeze_time
+            - np.maximum(t0 - self._starts[first_c], 0.0)
+            - np.maximum(self._ends[last_c] - t1, 0.0)
+        )
+
+        result = windows.copy()
+        result["freeze_time"] = np.where(has_bouts, freeze_time, 0.0)
+        result["bout_count"] = bout_count
+        return result
+
+    def freeze_time(self, cohort_id, day, t0, t1):
+        """
+        Seconds of freezing for one animal and day within [t0, t1).
+        """
+        window = pd.DataFrame(
+            {"cohort_id": [cohort_id], "day": [day], "t0": [t0], "t1": [t1]}
+        )
+        return float(self.query(window)["freeze_time"].iloc[0])
+
+
+def calculate_interval_freezing(freeze_frame_data, schedule, time_col="t(sec)"):
+    """
+    Calculates percent freezing for every animal, day and stimulus interval at once.
+
+    Frames are sorted once and turned into a cumulative freeze count per session, so
+    each (session, interval) pair is resolved with two np.searchsorted lookups instead
+    of filtering the frame table per interval.
+
+    Parameters:
+        freeze_frame_data (pd.DataFrame): must contain columns:
+            - time_col : time in seconds
+            - 'freeze' : binary indicator (0 or 1); NaN frames are ignored
+            - 'cohort_id', 'day'
+          plus optional metadata columns (e.g. 'condition', 'sex', 'young').
+        schedule (pd.DataFrame): Stimulus schedule with columns 'interval', 'start'
+            and 'end' (seconds, [start, end)). If it also has a 'day' column, each
+            interval only applies to that day; otherwise it applies to every day.
+        time_col (str): Time column in freeze_frame_data (default 't(sec)').
+
+    Returns:
+        pd.DataFrame: One row per (cohort_id, day, interval) with columns
+            'cohort_id', 'day', 'interval', 'start', 'end', 'n_frames',
+            'freezing(%)' and any preserved metadata columns.
+    """
+    preserve_cols = [col for col in PRESERVE_COLS if col in freeze_frame_data.columns]
+
+    data, session_starts = _sort_freeze_sessions(
+        freeze_frame_data[SESSION_COLS + preserve_cols + [time_col, "freeze"]],
+        time_col=time_col,
+    )
+    sessions = data[SESSION_COLS + preserve_cols].iloc[np.flatnonzero(session_starts)]
+    session_code = np.cumsum(session_starts) - 1
+
+    freeze = data["freeze"].to_numpy(dtype=np.float64)
+    valid = ~np.isnan(freeze)
+    cum_freeze = np.r_[0, np.cumsum(valid & (freeze == 1))]
+    cum_valid = np.r_[0, np.cumsum(valid)]
+
+    # Sessions laid out one after another on a single sorted time axis
+    times = data[time_col].to_numpy(dtype=np.float64)
+    t_min = times.min() if len(times) else 0.0
+    t_max = times.max() if len(times) else 0.0
+    span = t_max - t_min + 1.0
+    axis = times + session_code * span
+
+    # One row per (session, interval) pair
+    sessions = sessions.assign(_session=np.arange(len(sessions)))
+    if "day" in schedule.columns:
+        pairs = sessions.merge(schedule, on="day", how="inner")
+    else:
+        pairs = sessions.merge(schedule, how="cross")
+
+    offset = pairs["_session"].to_numpy() * span
+    start = np.clip(pairs["start"].to_numpy(dtype=np.float64), t_min, t_max + 0.5)
+    end = np.clip(pairs["end"].to_numpy(dtype=np.float64), t_min, t_max + 0.5)
+    first = np.searchsorted(axis, start + offset, side="left")
+    last = np.searchsorted(axis, end + offset, side="left")
+    last = np.maximum(last, first)
+
+    n_frames = cum_valid[last] - cum_valid[first]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        percent = (cum_freeze[last] - cum_freeze[first]) / n_frames * 100
+
+    interval_df = pairs[SESSION_COLS + ["interval", "start", "end"]].copy()
+    interval_df["n_frames"] = n_frames
+    interval_df["freezing(%)"] = np.where(n_frames > 0, percent, np.nan)
+    for col in preserve_cols:
+        interval_df[col] = pairs[col].to_numpy()
+
+    return interval_df
+
+
+def summarize_freeze_bouts_by_bin(
+    bouts_df, bin_width=60, group_cols=None, total_experiment_time=None
+):
+    """
+    Bins freeze bouts by the time bin in which they started and summarizes them with a
+    single groupby, for any bin width and grouping.
+
+    Parameters:
+        bouts_df (pd.DataFrame): Output of get_freeze_bouts, with 'bout_start' and
+            'duration' plus any grouping columns.
+        bin_width (float): Bin width in seconds (default 60).
+        group_cols (list): Columns to summarize by, e.g. ['cohort_id', 'day'] or
+            ['condition', 'sex', 'young'] (default: pool all bouts).
+        total_experiment_time (float): Optional, in seconds. If given, bouts starting
+            after it are dropped and every bin up to it is reported for each group,
+            with a count of 0 where a group has no bouts.
+
+    Returns:
+        summary_df (pd.DataFrame): One row per group and bin with columns
+            group_cols + ['time_bin', 'bin_start', 'bout_count', 'mean_duration',
+            'median_duration', 'total_freezing']. 'time_bin' is 1-based.
+    """
+    group_cols = list(group_cols) if group_cols is not None else []
+
+    binned = bouts_df[group_cols + ["duration"]].assign(
+        time_bin=(bouts_df["bout_start"] // bin_width + 1).astype(int)
+    )
+
+    if total_experiment_time is not None:
+        n_bins = int(np.ceil(total_experiment_time / bin_width))
+        binned = binned[binned["time_bin"] <= n_bins]
+
+    summary_df = (
+        binned.groupby(group_cols + ["time_bin"], observed=True, dropna=False)[
+            "duration"
+        ]
+        .agg(
+            bout_count="size",
+            mean_duration="mean",
+            median_duration="median",
+            total_freezing="sum",
+        )
+        .reset_index()
+    )
 
-    return pd.DataFrame(bouts)
+    if total_experiment_time is not None:
+        all_bins = pd.DataFrame({"time_bin": np.arange(1, n_bins + 1)})
+        if group_cols:
+            groups = binned[group_cols].drop_duplicates()
+            all_bins = groups.merge(all_bins, how="cross")
+        summary_df = all_bins.merge(
+            summary_df, on=group_cols + ["time_bin"], how="left"
+        )
+        summary_df["bout_count"] = summary_df["bout_count"].fillna(0).astype(int)
+        summary_df["total_freezing"] = summary_df["total_freezing"].fillna(0)
+
+    summary_df.insert(
+        len(group_cols) + 1, "bin_start", (summary_df["time_bin"] - 1) * bin_width
+    )
+    return summary_df
 
 
 def compare_freeze_bout_lengths_by_minute(freeze_frame_data, total_experiment_time=300):
@@ -232,23 +511,196 @@ def compare_freeze_bout_lengths_by_minute(freeze_frame_data, total_experiment_ti
     max_minute = total_experiment_time // 60
     bouts_df = bouts_df[bouts_df["minute_bin"] <= max_minute]
 
-    # Calculate summary statistics for each minute bin
+    # Calculate summary statistics for each minute bin in one groupby
+    minute_summary = summarize_freeze_bouts_by_bin(
+        bouts_df, bin_width=60, total_experiment_time=max_minute * 60
+    )
     summary = {}
-    for minute in range(1, max_minute + 1):
-        minute_data = bouts_df[bouts_df["minute_bin"] == minute]
-        summary[f"minute_{minute}"] = {
-            "bout_count": len(minute_data),
-            "median_duration": (
-                minute_data["duration"].median() if not minute_data.empty else None
-            ),
-            "mean_duration": (
-                minute_data["duration"].mean() if not minute_data.empty else None
-            ),
+    for row in minute_summary.itertuples(index=False):
+        has_bouts = row.bout_count > 0
+        summary[f"minute_{row.time_bin}"] = {
+            "bout_count": row.bout_count,
+            "median_duration": row.median_duration if has_bouts else None,
+            "mean_duration": row.mean_duration if has_bouts else None,
         }
 
     return bouts_df, summary
 
 
+class FreezeStatsStore:
+    """
+    Incremental on-disk store of per-session freeze statistics.
+
+    For every (cohort_id, day) session the store keeps its freezing bouts, transitions
+    and a one-row summary as Parquet files, keyed by a content hash of the session's
+    time and freeze vectors (plus preserved metadata). update() only recomputes sessions
+    that are new or whose hash changed; aggregate views are concatenated from the
+    stored pieces.
+    """
+
+    TABLES = ["bouts", "transitions", "summary"]
+
+    def __init__(self, store_dir):
+        """
+        Parameters:
+            store_dir (str): Directory holding one sub-directory per table and the
+                'index.json' manifest.
+        """
+        self.store_dir = store_dir
+        self.index_path = os.path.join(store_dir, "index.json")
+        for table in self.TABLES:
+            os.makedirs(os.path.join(store_dir, table), exist_ok=True)
+        self.index = {}
+        if os.path.exists(self.index_path):
+            with open(self.index_path, "r") as f:
+                self.index = json.load(f)
+
+    def _save_index(self):
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.index, f, indent=1)
+        os.replace(tmp_path, self.index_path)
+
+    @staticmethod
+    def _session_key(cohort_id, day):
+        return hashlib.sha1(f"{cohort_id}\x1f{day}".encode("utf-8")).hexdigest()
+
+    def _piece_path(self, table, key):
+        return os.path.join(self.store_dir, table, f"{key}.parquet")
+
+    def update(self, freeze_frame_data):
+        """
+        Adds new sessions and recomputes changed ones; unchanged sessions are skipped.
+
+        Parameters:
+            freeze_frame_data (pd.DataFrame): Frame-level data with 't(sec)', 'freeze',
+                'cohort_id', 'day' and optional preserved columns. It may hold only the
+                newly arrived sessions.
+
+        Returns:
+            pd.DataFrame: One row per input session with columns 'cohort_id', 'day'
+            and 'status' ('new', 'changed' or 'unchanged').
+        """
+        preserve_cols = [
+            col for col in PRESERVE_COLS if col in freeze_frame_data.columns
+        ]
+        data, session_starts = _sort_freeze_sessions(
+            freeze_frame_data[SESSION_COLS + preserve_cols + ["t(sec)", "freeze"]]
+        )
+        bounds = np.r_[np.flatnonzero(session_starts), len(data)]
+        times = data["t(sec)"].to_numpy(dtype=np.float64)
+        freeze = data["freeze"].to_numpy(dtype=np.float64)
+        first_rows = data[SESSION_COLS + preserve_cols].iloc[bounds[:-1]]
+        meta = first_rows.astype(str).to_numpy()
+
+        status = []
+        stale_rows = []
+        for i, (lo, hi) in enumerate(zip(bounds[:-1], bounds[1:])):
+            cohort_id, day = first_rows[SESSION_COLS].iloc[i]
+            key = self._session_key(cohort_id, day)
+            digest = hashlib.sha1()
+            digest.update(times[lo:hi].tobytes())
+            digest.update(freeze[lo:hi].tobytes())
+            digest.update("\x1f".join(meta[i]).encode("utf-8"))
+            content_hash = digest.hexdigest()
+
+            entry = self.index.get(key)
+            if entry is not None and entry["hash"] == content_hash:
+                state = "unchanged"
+            else:
+                state = "new" if entry is None else "changed"
+                stale_rows.append(np.arange(lo, hi))
+                self.index[key] = {
+                    "cohort_id": str(cohort_id),
+                    "day": str(day),
+                    "hash": content_hash,
+                }
+            status.append({"cohort_id": cohort_id, "day": day, "status": state})
+
+        if stale_rows:
+            self._compute(data.iloc[np.concatenate(stale_rows)])
+            self._save_index()
+
+        return pd.DataFrame(status, columns=SESSION_COLS + ["status"])
+
+    def _compute(self, data):
+        """Computes and writes all tables for the sessions present in `data`."""
+        bouts_df = get_freeze_bouts(data)
+        transitions_df = find_freeze_transitions(data, time_col="t(sec)")
+
+        # Session-level summary built from the same bouts
+        summary_df = data.groupby(SESSION_COLS, observed=True, sort=True).agg(
+            n_frames=("freeze", "count"),
+            freezing_frames=("freeze", lambda f: int((f == 1).sum())),
+            session_length=("t(sec)", lambda t: t.max() - t.min()),
+        )
+        bout_stats = bouts_df.groupby(SESSION_COLS, observed=True).agg(
+            bout_count=("duration", "size"),
+            median_duration=("duration", "median"),
+            total_freezing=("duration", "sum"),
+        )
+        summary_df = summary_df.join(bout_stats, how="left").reset_index()
+        summary_df["bout_count"] = summary_df["bout_count"].fillna(0).astype(int)
+        summary_df["total_freezing"] = summary_df["total_freezing"].fillna(0.0)
+        summary_df["freezing(%)"] = (
+            summary_df["freezing_frames"] / summary_df["n_frames"] * 100
+        )
+
+        tables = {
+            "bouts": bouts_df,
+            "transitions": transitions_df,
+            "summary": summary_df,
+        }
+        for table, table_df in tables.items():
+            # Pieces are matched by string keys but keep the original key values
+            string_keys = [table_df[col].astype(str).to_numpy() for col in SESSION_COLS]
+            pieces = dict(tuple(table_df.groupby(string_keys, sort=False)))
+            for cohort_id, day in (
+                data[SESSION_COLS].drop_duplicates().itertuples(index=False)
+            ):
+                key = self._session_key(cohort_id, day)
+                piece = pieces.get((str(cohort_id), str(day)), table_df.iloc[:0])
+                piece.to_parquet(self._piece_path(table, key), index=False)
+
+    def load(self, table):
+        """
+        Concatenates the stored pieces of one table ('bouts', 'transitions' or
+        'summary') across all sessions.
+        """
+        if table not in self.TABLES:
+            raise ValueError(f"Unknown table '{table}', expected one of {self.TABLES}")
+        pieces = [
+            pd.read_parquet(self._piece_path(table, key))
+            for key in sorted(
+                self.index,
+                key=lambda k: (self.index[k]["cohort_id"], self.index[k]["day"]),
+            )
+        ]
+        non_empty = [piece for piece in pieces if not piece.empty]
+        if not non_empty:
+            # Keep the table's columns, e.g. when no stored session has a bout
+            return pieces[0].iloc[:0] if pieces else pd.DataFrame()
+        return concat_long_tables(non_empty)
+
+    def median_freeze_duration(self):
+        """
+        Overall median bout duration across all stored sessions.
+        """
+        bouts_df = self.load("bouts")
+        return bouts_df["duration"].median() if not bouts_df.empty else 0
+
+    def binned_summary(self, bin_width=60, group_cols=None, total_experiment_time=None):
+        """
+        summarize_freeze_bouts_by_bin over the stored bouts of all sessions.
+        """
+        return summarize_freeze_bouts_by_bin(
+            self.load("bouts"),
+            bin_width=bin_width,
+            group_cols=group_cols,
+            total_experiment_time=total_experiment_time,
+        )
+
+
 def plot_freeze_duration_pointplot(bouts_df, group_cols, subset_col):
     """
     Creates multiple side-by-side pointplots of 'duration' by 'minute_bin',
@@ -1,6 +1,17 @@
+import os
+import glob
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
 import h5py
+import numpy as np
 import pandas as pd
 from freeze_analysis_tools import find_freeze_transitions
+from table_schema import (
+    MOSEQ_SCHEMA,
+    MOSEQ_LATENT_DTYPE,
+    apply_schema,
+    concat_long_tables,
+)
 import re
 from sklearn.metrics import f1_score, recall_score
 
@@ -51,62 +62,374 @@ class MoseqProcessor:
 
         return cohort_id, day
 
-    def load_data(self):
+    MOSEQ_DATASETS = ["centroid", "heading", "latent_state", "syllable"]
+
+    def _select_groups(self, hdf, cohort_ids=None, days=None):
+        """
+        Group names whose parsed cohort_id and day pass the filters, decided from the
+        names alone so that skipped groups are never read.
+
+        Returns:
+            list: (group_name, cohort_id, day) tuples.
+        """
+        selected = []
+        for group_name in hdf.keys():
+            cohort_id, day = self._extract_cohort_and_day(group_name)
+            if cohort_ids is not None and cohort_id not in cohort_ids:
+                continue
+            if days is not None and day not in days:
+                continue
+            selected.append((group_name, cohort_id, day))
+        return selected
+
+    def list_sessions(self):
+        """
+        Lists the sessions in the h5 file without loading any arrays.
+
+        Returns:
+            pd.DataFrame: Columns 'group_name', 'cohort_id', 'day' and 'n_frames'.
+        """
+        with h5py.File(self.file_path, "r") as hdf:
+            sessions = [
+                {
+                    "group_name": group_name,
+                    "cohort_id": cohort_id,
+                    "day": day,
+                    "n_frames": hdf[group_name]["syllable"].shape[0],
+                }
+                for group_name, cohort_id, day in self._select_groups(hdf)
+            ]
+        return pd.DataFrame(
+            sessions, columns=["group_name", "cohort_id", "day", "n_frames"]
+        )
+
+    def load_data(
+        self,
+        keep_float64=False,
+        cohort_ids=None,
+        days=None,
+        columns=None,
+        frames=None,
+    ):
         """
         Loads MoSeq data from the h5 file and stores it in the 'data' attribute.
 
+        Columns follow MOSEQ_SCHEMA: categorical 'cohort_id' and 'day', float32
+        centroid, heading and latents, int16 'syllable'. Groups are filtered by name
+        before any array is read, only the requested datasets are read, and `frames`
+        is applied as an h5py hyperslab so only that part of each array leaves disk.
+
+        Parameters:
+            keep_float64 (bool): If True, float columns stay float64.
+            cohort_ids (list, optional): Only load these cohort IDs.
+            days (list, optional): Only load these days.
+            columns (list, optional): Datasets to read, any of 'centroid', 'heading',
+                'latent_state' and 'syllable' (default: all).
+            frames (slice, optional): Frame range to read from every session,
+                e.g. slice(0, 9000). The original frame numbers are kept in a
+                'frame' column, which create_time_column uses.
+
         Returns:
             pd.DataFrame: The loaded data as a DataFrame.
         """
-
+        if columns is None:
+            columns = self.MOSEQ_DATASETS
+        unknown = set(columns) - set(self.MOSEQ_DATASETS)
+        if unknown:
+            raise ValueError(f"Unknown MoSeq datasets: {sorted(unknown)}")
+        sliced = frames is not None
+        if frames is None:
+            frames = slice(None)
+        if cohort_ids is not None:
+            cohort_ids = set(cohort_ids)
+        if days is not None:
+            days = set(days)
+
+        float_dtype = "float64" if keep_float64 else MOSEQ_LATENT_DTYPE
         all_data = []
 
         with h5py.File(self.file_path, "r") as hdf:
-            for group_name in hdf.keys():
+            for group_name, cohort_id, day in self._select_groups(
+                hdf, cohort_ids, days
+            ):
                 group_data = hdf[group_name]
-
-                # Extract data arrays
-                centroid = group_data["centroid"][:]
-                heading = group_data["heading"][:]
-                latent_state = group_data["latent_state"][:]
-                syllable = group_data["syllable"][:]
-
-                # Create the main DataFrame
-                df = pd.DataFrame(
-                    {
-                        "centroid_x": centroid[:, 0],
-                        "centroid_y": centroid[:, 1],
-                        "heading": heading,
-                        "syllable": syllable,
-                    }
-                )
-
-                # Create and concatenate the latent state DataFrame
-                latent_df = pd.DataFrame(
-                    latent_state,
-                    columns=[f"latent_{i}" for i in range(latent_state.shape[1])],
-                )
-                df = pd.concat([df, latent_df], axis=1)
-
-                # Extract cohort_id and day
-                cohort_id, day = self._extract_cohort_and_day(group_name)
+                session = {}
+
+                # Extract the requested data arrays (hyperslab reads)
+                if "centroid" in columns:
+                    centroid = group_data["centroid"][frames].astype(
+                        float_dtype, copy=False
+                    )
+                    session["centroid_x"] = centroid[:, 0]
+                    session["centroid_y"] = centroid[:, 1]
+                if "heading" in columns:
+                    session["heading"] = group_data["heading"][frames].astype(
+                        float_dtype, copy=False
+                    )
+                if "syllable" in columns:
+                    session["syllable"] = group_data["syllable"][frames]
+                if "latent_state" in columns:
+                    latent_state = group_data["latent_state"][frames].astype(
+                        float_dtype, copy=False
+                    )
+                    for i in range(latent_state.shape[1]):
+                        session[f"latent_{i}"] = latent_state[:, i]
+
+                df = pd.DataFrame(session)
+                if sliced:
+                    n_total = group_data[columns[0]].shape[0]
+                    df["frame"] = np.asarray(range(n_total)[frames])
+
+                # Add cohort_id and day
                 df["cohort_id"] = cohort_id
                 df["day"] = day
 
                 all_data.append(df)
 
-        self.data = pd.concat(all_data, ignore_index=True)
+        if not all_data:
+            self.data = pd.DataFrame()
+            return self.data
+
+        self.data = apply_schema(
+            pd.concat(all_data, ignore_index=True),
+            MOSEQ_SCHEMA,
+            keep_float64=keep_float64,
+        )
         return self.data
 
+    def _latent_source(self, hdf, group_name):
+        """
+        Array-like view of a session's latent_state without reading it: a read-only
+        np.memmap when the dataset is contiguous and uncompressed, otherwise the h5py
+        dataset itself (sliced reads become hyperslab reads).
+        """
+        dataset = hdf[group_name]["latent_state"]
+        offset = dataset.id.get_offset()
+        if (
+            dataset.chunks is None
+            and dataset.compression is None
+            and offset is not None
+        ):
+            return np.memmap(
+                self.file_path,
+                mode="r",
+                dtype=dataset.dtype,
+                shape=dataset.shape,
+                offset=offset,
+            )
+        return dataset
+
+    def latent_view(self, group_name, frames=None):
+        """
+        Returns one session's latent states as an array, without building a DataFrame.
+
+        For contiguous datasets this is a zero-copy memory map of the h5 file; otherwise
+        only the requested frames are read.
+
+        Parameters:
+            group_name (str): Group name in the h5 file (see list_sessions).
+            frames (slice, optional): Frame range to return.
+
+        Returns:
+            np.ndarray: Array of shape (n_frames, n_latents).
+        """
+        if frames is None:
+            frames = slice(None)
+        with h5py.File(self.file_path, "r") as hdf:
+            return self._latent_source(hdf, group_name)[frames]
+
+    def iter_latent_chunks(self, chunk_size=10000, cohort_ids=None, days=None):
+        """
+        Iterates over latent states in fixed-size chunks, one session at a time.
+
+        Parameters:
+            chunk_size (int): Maximum number of frames per chunk (default: 10000).
+            cohort_ids (list, optional): Only these cohort IDs.
+            days (list, optional): Only these days.
+
+        Yields:
+            tuple: (group_name, cohort_id, day, start_frame, chunk) where chunk is an
+            array of shape (<= chunk_size, n_latents).
+        """
+        if cohort_ids is not None:
+            cohort_ids = set(cohort_ids)
+        if days is not None:
+            days = set(days)
+
+        with h5py.File(self.file_path, "r") as hdf:
+            for group_name, cohort_id, day in self._select_groups(
+                hdf, cohort_ids, days
+            ):
+                source = self._latent_source(hdf, group_name)
+                for start in range(0, source.shape[0], chunk_size):
+                    chunk = np.asarray(source[start : start + chunk_size])
+                    yield group_name, cohort_id, day, start, chunk
+
+    def latent_means(self, chunk_size=10000, cohort_ids=None, days=None):
+        """
+        Per-session mean latent state, accumulated chunk by chunk.
+
+        Returns:
+            pd.DataFrame: One row per session with 'group_name', 'cohort_id', 'day',
+            'n_frames' and 'latent_<i>' mean columns.
+        """
+        sums = {}
+        for group_name, cohort_id, day, _, chunk in self.iter_latent_chunks(
+            chunk_size, cohort_ids, days
+        ):
+            entry = sums.setdefault(
+                group_name, [cohort_id, day, 0, np.zeros(chunk.shape[1])]
+            )
+            entry[2] += chunk.shape[0]
+            entry[3] += chunk.sum(axis=0, dtype=np.float64)
+
+        rows = []
+        for group_name, (cohort_id, day, n_frames, total) in sums.items():
+            row = {
+                "group_name": group_name,
+                "cohort_id": cohort_id,
+                "day": day,
+                "n_frames": n_frames,
+            }
+            mean = total / n_frames if n_frames else total * np.nan
+            row.update({f"latent_{i}": value for i, value in enumerate(mean)})
+            rows.append(row)
+        return pd.DataFrame(rows)
+
+    def latent_pca(self, n_components=2, chunk_size=10000, cohort_ids=None, days=None):
+        """
+        Principal components of the latent states, fitted from chunked sums so the
+        full latent matrix is never held in memory.
+
+        Returns:
+            dict: 'mean' (n_latents,), 'components' (n_components, n_latents) and
+            'explained_variance' (n_components,).
+        """
+        n_frames = 0
+        total = None
+        cross = None
+        for *_, chunk in self.iter_latent_chunks(chunk_size, cohort_ids, days):
+            chunk = chunk.astype(np.float64, copy=False)
+            if total is None:
+                total = np.zeros(chunk.shape[1])
+                cross = np.zeros((chunk.shape[1], chunk.shape[1]))
+            n_frames += chunk.shape[0]
+            total += chunk.sum(axis=0)
+            cross += chunk.T @ chunk
+
+        if not n_frames:
+            raise ValueError("No latent states found for the requested sessions.")
+
+        mean = total / n_frames
+        covariance = (cross - n_frames * np.outer(mean, mean)) / max(n_frames - 1, 1)
+        eigenvalues, eigenvectors = np.linalg.eigh(covariance)
+        order = np.argsort(eigenvalues)[::-1][:n_components]
+
+        return {
+            "mean": mean,
+            "components": eigenvectors[:, order].T,
+            "explained_variance": eigenvalues[order],
+        }
+
+    def project_latents(
+        self, components, mean=None, chunk_size=10000, cohort_ids=None, days=None
+    ):
+        """
+        Projects latent states onto `components` chunk by chunk (e.g. the output of
+        latent_pca), materializing only the projection.
+
+        Returns:
+            pd.DataFrame: Columns 'cohort_id', 'day', 'frame' and 'pc_<i>'.
+        """
+        components = np.asarray(components)
+        pieces = []
+        for _, cohort_id, day, start, chunk in self.iter_latent_chunks(
+            chunk_size, cohort_ids, days
+        ):
+            centered = chunk - mean if mean is not None else chunk
+            projected = centered @ components.T
+            piece = pd.DataFrame(
+                projected, columns=[f"pc_{i}" for i in range(projected.shape[1])]
+            )
+            piece.insert(0, "frame", np.arange(start, start + len(chunk)))
+            piece.insert(0, "day", day)
+            piece.insert(0, "cohort_id", cohort_id)
+            pieces.append(piece)
+
+        if not pieces:
+            return pd.DataFrame()
+        return apply_schema(pd.concat(pieces, ignore_index=True), MOSEQ_SCHEMA)
+
+
+def _load_moseq_file(file_path, **load_kwargs):
+    """
+    Loads one KPMS results file and tags it with its source file name.
+    """
+    df = MoseqProcessor(file_path).load_data(**load_kwargs)
+    df["source_file"] = pd.Categorical.from_codes(
+        np.zeros(len(df), dtype=np.int8), categories=[os.path.basename(file_path)]
+    )
+    return df
+
+
+def load_moseq_files(file_paths, n_jobs=1, output_path=None, **load_kwargs):
+    """
+    Loads several KPMS result files into one DataFrame, optionally reading them in
+    parallel worker processes.
+
+    Every file is loaded with MoseqProcessor.load_data, so all share MOSEQ_SCHEMA, and
+    the tables are concatenated once with their categoricals kept.
+
+    Parameters:
+        file_paths (list or str): List of .h5 paths, or a glob pattern such as
+            'results/*.h5'.
+        n_jobs (int): Number of worker processes (default: 1, in-process). None uses
+            all cores.
+        output_path (str, optional): If given, the combined table is also written
+            there as Parquet.
+        **load_kwargs: Passed to MoseqProcessor.load_data (e.g. days, columns,
+            keep_float64).
+
+    Returns:
+        pd.DataFrame: Combined MoSeq data with an added 'source_file' column.
+    """
+    if isinstance(file_paths, str):
+        file_paths = sorted(glob.glob(file_paths))
+    if not file_paths:
+        raise ValueError("No MoSeq files to load.")
+
+    if n_jobs is None:
+        n_jobs = os.cpu_count() or 1
+
+    load = partial(_load_moseq_file, **load_kwargs)
+    if n_jobs <= 1:
+        frames = [load(file_path) for file_path in file_paths]
+    else:
+        with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+            frames = list(executor.map(load, file_paths))
+
+    combined = concat_long_tables([df for df in frames if not df.empty])
+
+    if output_path is not None:
+        combined.to_parquet(output_path, index=False)
+
+    return combined
+
 
 def create_time_column(df, frame_rate):
     """
     Adds a time column to the DataFrame based on frame number and frame rate,
     ensuring each (cohort_id, day) group is reindexed separately.
 
+    Frame numbers come from the 'frame' column when present (tables loaded with
+    MoseqProcessor.load_data(frames=...)); otherwise they are counted for all sessions
+    with a single groupby cumcount.
+
     Parameters:
         df (pd.DataFrame): The DataFrame containing cohort_id and day.
-        frame_rate (float): The frame rate to calculate time per frame.
+        frame_rate (float, str or dict): The frame rate to calculate time per frame.
+            Either one value for all sessions, the name of a column holding each row's
+            frame rate, or a mapping keyed by (cohort_id, day) or by cohort_id.
 
     Returns:
         pd.DataFrame: The DataFrame with an added 'time' column.
@@ -116,32 +439,77 @@ def create_time_column(df, frame_rate):
 
     df = df.copy()  # Avoid modifying the original DataFrame
 
-    # Loop through each unique (cohort_id, day) combination
-    for (cohort, day), group in df.groupby(["cohort_id", "day"]):
-        if group.empty:
-            continue  # Skip empty groups
-
-        # Reset index within the group to create a unique frame count per trial
-        reindexed_group = group.reset_index(drop=True)
+    # Frame number within each (cohort_id, day) trial; NaN keys get no time
+    frame = df.groupby(["cohort_id", "day"], observed=True).cumcount()
+    if "frame" in df.columns:
+        frame = df["frame"].fillna(frame)
+
+    if isinstance(frame_rate, str):
+        rate = df[frame_rate].to_numpy(dtype=np.float64)
+    elif isinstance(frame_rate, dict):
+        session_keys = pd.MultiIndex.from_frame(df[["cohort_id", "day"]].astype(object))
+        if any(isinstance(key, tuple) for key in frame_rate):
+            rate = session_keys.map(frame_rate)
+        else:
+            rate = session_keys.get_level_values("cohort_id").map(frame_rate)
+        rate = np.asarray(rate, dtype=np.float64)
+        if np.isnan(rate).any():
+            raise ValueError("frame_rate mapping is missing some sessions.")
+    else:
+        rate = frame_rate
 
-        # Assign time as the new index divided by the frame rate
-        df.loc[group.index, "time"] = reindexed_group.index / frame_rate
+    df["time"] = frame / rate
 
     return df
 
 
-def extract_moseq_windows(kp_data, freeze_transitions, window_size=3):
+def _sort_sessions(df, time_col="time"):
+    """
+    Orders rows by (cohort_id, day) and time and returns the session layout.
+
+    Returns:
+        order (np.ndarray): Row positions of `df` in sorted order.
+        sessions (pd.MultiIndex): Session keys, one per session code.
+        bounds (np.ndarray): bounds[c]:bounds[c + 1] is session c within `order`.
+    """
+    session_codes = (
+        df.groupby(["cohort_id", "day"], sort=False, observed=True, dropna=False)
+        .ngroup()
+        .to_numpy()
+    )
+    first_rows = np.unique(session_codes, return_index=True)[1]
+    sessions = pd.MultiIndex.from_frame(
+        df[["cohort_id", "day"]].iloc[first_rows].astype(object)
+    )
+    order = np.lexsort((df[time_col].to_numpy(), session_codes))
+    bounds = np.searchsorted(session_codes[order], np.arange(len(sessions) + 1))
+    return order, sessions, bounds
+
+
+def extract_moseq_windows(
+    kp_data, freeze_transitions, window_size=3, return_array=False, frame_rate=None
+):
     """
     Extracts MoSeq data surrounding freeze transitions.
 
+    kp_data is sorted into per-session time arrays once; the closest frame and the
+    window bounds of every transition are then found with np.searchsorted.
+
     Parameters:
     kp_data (pd.DataFrame): Processed MoSeq data with 'cohort_id', 'day', and 'time' columns.
     freeze_transitions (pd.DataFrame): DataFrame containing freeze transition data.
             Must have columns ['time', 'cohort_id', 'day', 'transition_type'].
     window_size (int, optional): Number of seconds before and after the transition time to extract (default: 3).
+    return_array (bool, optional): If True, also return a dense syllable array.
+    frame_rate (float, optional): Frames per second used to size the dense array
+            (default: inferred from the median frame interval of kp_data).
 
     Returns:
         pd.DataFrame: A DataFrame containing the extracted MoSeq data with the specified columns.
+        np.ndarray (only if return_array=True): Array of shape
+            (len(freeze_transitions), 2 * round(window_size * frame_rate) + 1) holding
+            the syllables at fixed frame offsets around each transition, -1 where no
+            frame exists.
     """
     required_cols = ["time", "cohort_id", "day", "transition_type"]
     if not all(col in freeze_transitions.columns for col in required_cols):
@@ -155,48 +523,425 @@ def extract_moseq_windows(kp_data, freeze_transitions, window_size=3):
         "relative_time",
         "transition_type",
     ]
-    result_data = []
 
-    # Iterate through each transition in freeze_transitions
-    for _, transition in freeze_transitions.iterrows():
-        cohort_id = transition["cohort_id"]
-        day = transition["day"]
-        transition_time = transition["time"]
-        transition_type = transition["transition_type"]
+    order, sessions, bounds = _sort_sessions(kp_data)
+    times = kp_data["time"].to_numpy()[order]
+
+    codes = sessions.get_indexer(
+        pd.MultiIndex.from_frame(
+            freeze_transitions[["cohort_id", "day"]].astype(object)
+        )
+    )
+    transition_times = freeze_transitions["time"].to_numpy(dtype=np.float64)
+
+    closest = np.full(len(freeze_transitions), -1)
+    lo = np.zeros(len(freeze_transitions), dtype=np.intp)
+    hi = np.zeros(len(freeze_transitions), dtype=np.intp)
+
+    # One vectorized search per session holding transitions
+    for code in np.unique(codes[codes >= 0]):
+        rows = np.flatnonzero(codes == code)
+        start, stop = bounds[code], bounds[code + 1]
+        session_times = times[start:stop]
+        t = transition_times[rows]
+
+        # Closest frame: the nearer of the two neighbours (earlier one on ties)
+        right = np.clip(np.searchsorted(session_times, t), 0, len(session_times) - 1)
+        left = np.clip(right - 1, 0, len(session_times) - 1)
+        use_left = np.abs(session_times[left] - t) <= np.abs(session_times[right] - t)
+        nearest = np.where(use_left, left, right)
+
+        closest_time = session_times[nearest]
+        closest[rows] = start + nearest
+        lo[rows] = start + np.searchsorted(
+            session_times, closest_time - window_size, side="left"
+        )
+        hi[rows] = start + np.searchsorted(
+            session_times, closest_time + window_size, side="right"
+        )
+
+    # Expand [lo, hi) ranges into one flat list of sorted-row positions
+    lengths = hi - lo
+    transition_rows = np.repeat(np.arange(len(freeze_transitions)), lengths)
+    window_positions = (
+        np.arange(lengths.sum())
+        - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        + np.repeat(lo, lengths)
+    )
+    source_rows = order[window_positions]
+
+    final_df = kp_data.iloc[source_rows][["syllable", "cohort_id", "day", "time"]]
+    final_df = final_df.reset_index(drop=True)
+    final_df["relative_time"] = (
+        final_df["time"].to_numpy() - times[closest[transition_rows]]
+    )
+    final_df["transition_type"] = freeze_transitions["transition_type"].to_numpy()[
+        transition_rows
+    ]
+    final_df = final_df[selected_columns]
+
+    if not return_array:
+        return final_df
+
+    if frame_rate is None:
+        frame_rate = 1.0 / np.median(np.diff(times)[np.diff(times) > 0])
+    half_width = int(round(window_size * frame_rate))
+    offsets = np.arange(-half_width, half_width + 1)
+
+    # Fixed frame offsets around the closest frame, kept inside its session
+    positions = closest[:, None] + offsets[None, :]
+    session_start = np.where(codes >= 0, bounds[np.maximum(codes, 0)], 0)
+    session_stop = np.where(codes >= 0, bounds[np.maximum(codes, 0) + 1], 0)
+    valid = (
+        (closest[:, None] >= 0)
+        & (positions >= session_start[:, None])
+        & (positions < session_stop[:, None])
+    )
+    syllables = kp_data["syllable"].to_numpy()[order]
+    syllable_array = np.full(positions.shape, -1, dtype=np.int64)
+    syllable_array[valid] = syllables[positions[valid]]
+
+    return final_df, syllable_array
 
-        # Subset kp_data by cohort_id and day
-        subset = kp_data[(kp_data["cohort_id"] == cohort_id) & (kp_data["day"] == day)]
 
-        if subset.empty:
-            continue  # Skip if no matching data
+def _syllable_bouts(moseq_data, syllable_col="syllable", time_col="time"):
+    """
+    Splits every session's syllable sequence into bouts of consecutive identical
+    syllables, in (session, time) order.
+
+    Returns:
+        order (np.ndarray): Row positions of moseq_data in sorted order.
+        sessions (pd.MultiIndex): Session keys, one per session code.
+        bouts (dict): Per-bout arrays 'start' (position within `order`),
+            'n_frames', 'session', 'syllable', 'duration' (seconds) and
+            'last_of_session', plus 'frame_bout', the bout of each sorted frame.
+    """
+    if moseq_data.empty:
+        raise ValueError("moseq_data is empty.")
+
+    order, sessions, bounds = _sort_sessions(moseq_data, time_col=time_col)
+    syllables = moseq_data[syllable_col].to_numpy()[order]
+    if np.isnan(syllables.astype(np.float64)).any() or syllables.min() < 0:
+        raise ValueError(f"'{syllable_col}' must hold non-negative integer labels.")
+    syllables = syllables.astype(np.int64)
+    times = moseq_data[time_col].to_numpy(dtype=np.float64)[order]
+
+    session = np.repeat(np.arange(len(sessions)), np.diff(bounds))
+    new_session = np.zeros(len(syllables), dtype=bool)
+    new_session[bounds[:-1]] = True
+
+    # A new bout starts at each session start or label change
+    bout_start = new_session | np.r_[True, syllables[1:] != syllables[:-1]]
+    starts = np.flatnonzero(bout_start)
+    bout_session = session[starts]
+    bout_frames = np.diff(np.r_[starts, len(syllables)])
+
+    # A bout lasts until the next bout starts, or to its session's last frame
+    steps = np.diff(times)[~new_session[1:]]
+    steps = steps[steps > 0]
+    frame_interval = float(np.median(steps)) if len(steps) else 0.0
+    last_of_session = np.r_[bout_session[1:] != bout_session[:-1], True]
+    next_start = np.r_[starts[1:], 0]
+    bout_duration = np.where(
+        last_of_session,
+        times[starts + bout_frames - 1] - times[starts] + frame_interval,
+        times[next_start] - times[starts],
+    )
+
+    bouts = {
+        "start": starts,
+        "n_frames": bout_frames,
+        "session": bout_session,
+        "syllable": syllables[starts],
+        "duration": bout_duration,
+        "last_of_session": last_of_session,
+        "frame_bout": np.cumsum(bout_start) - 1,
+    }
+    return order, sessions, bouts
+
+
+def syllable_transition_stats(
+    moseq_data,
+    syllable_col="syllable",
+    time_col="time",
+    n_syllables=None,
+    normalize="row",
+):
+    """
+    Syllable usage, mean syllable duration and transition matrices for every
+    (cohort_id, day) session at once.
+
+    Consecutive frames with the same syllable form one syllable bout. Usage and
+    transitions are counted over bouts, so transitions are between different
+    syllables and the diagonal is zero. All sessions are counted with single
+    np.bincount calls on encoded (session, syllable) and (session, from, to) indices.
+
+    Parameters:
+        moseq_data (pd.DataFrame): KPMS data with cohort_id, day, time and syllable
+            columns.
+        syllable_col (str): Column with integer syllable labels (>= 0).
+        time_col (str): Time column (seconds) used to order frames and measure
+            bout durations.
+        n_syllables (int, optional): Size of the syllable axis; defaults to the
+            largest syllable + 1. Set it when stacking results from several runs.
+        normalize (str or None): 'row' gives P(next | current) per row, 'bigram'
+            makes each session's matrix sum to 1, None keeps raw counts.
+
+    Returns:
+        transitions (np.ndarray): Shape (n_sessions, n_syllables, n_syllables);
+            transitions[s, i, j] is from syllable i to syllable j in session s.
+        stats (pd.DataFrame): One row per (cohort_id, day, syllable) with
+            'n_bouts', 'usage' (fraction of the session's bouts), 'n_frames' and
+            'mean_duration' (seconds, NaN for unused syllables).
+        sessions (pd.MultiIndex): (cohort_id, day) of each entry along axis 0.
+    """
+    if normalize not in ("row", "bigram", None):
+        raise ValueError("normalize must be 'row', 'bigram' or None.")
+    order, sessions, bouts = _syllable_bouts(moseq_data, syllable_col, time_col)
+    n_sessions = len(sessions)
+    if n_syllables is None:
+        n_syllables = int(bouts["syllable"].max()) + 1
+    elif bouts["syllable"].max() >= n_syllables:
+        raise ValueError(f"Found syllable labels >= n_syllables ({n_syllables}).")
+    bout_session, bout_syllable = bouts["session"], bouts["syllable"]
+    bout_frames, bout_duration = bouts["n_frames"], bouts["duration"]
+    last_of_session = bouts["last_of_session"]
+
+    pair_index = bout_session * n_syllables + bout_syllable
+    size = n_sessions * n_syllables
+    n_bouts = np.bincount(pair_index, minlength=size).reshape(n_sessions, -1)
+    n_frames = np.bincount(pair_index, weights=bout_frames, minlength=size)
+    total_duration = np.bincount(pair_index, weights=bout_duration, minlength=size)
+
+    # Transitions between consecutive bouts of the same session
+    follows = ~last_of_session
+    transition_index = (
+        pair_index[:-1][follows[:-1]] * n_syllables + bout_syllable[1:][follows[:-1]]
+    )
+    transitions = (
+        np.bincount(transition_index, minlength=size * n_syllables)
+        .reshape(n_sessions, n_syllables, n_syllables)
+        .astype(np.float64)
+    )
+    with np.errstate(invalid="ignore", divide="ignore"):
+        if normalize == "row":
+            totals = transitions.sum(axis=2, keepdims=True)
+            transitions = np.where(totals > 0, transitions / totals, 0.0)
+        elif normalize == "bigram":
+            totals = transitions.sum(axis=(1, 2), keepdims=True)
+            transitions = np.where(totals > 0, transitions / totals, 0.0)
+
+        session_bouts = n_bouts.sum(axis=1, keepdims=True)
+        usage = np.where(session_bouts > 0, n_bouts / session_bouts, 0.0)
+        mean_duration = np.where(
+            n_bouts.ravel() > 0, total_duration / n_bouts.ravel(), np.nan
+        )
 
-        # Find the closest matching time point
-        closest_index = (subset["time"] - transition_time).abs().idxmin()
-        closest_time = subset.loc[closest_index, "time"]
+    stats = pd.DataFrame(
+        {
+            "cohort_id": np.repeat(sessions.get_level_values(0), n_syllables),
+            "day": np.repeat(sessions.get_level_values(1), n_syllables),
+            "syllable": np.tile(np.arange(n_syllables), n_sessions),
+            "n_bouts": n_bouts.ravel(),
+            "usage": usage.ravel(),
+            "n_frames": n_frames.astype(np.int64),
+            "mean_duration": mean_duration,
+        }
+    )
+    sessions = sessions.set_names(["cohort_id", "day"])
+
+    return transitions, stats, sessions
 
-        # Extract window of ±window_size seconds
-        window_data = subset[
-            (subset["time"] >= closest_time - window_size)
-            & (subset["time"] <= closest_time + window_size)
-        ].copy()
 
-        # Assign transition type to the window
-        window_data["transition_type"] = transition_type
+def segment_syllable_bouts(
+    moseq_data,
+    syllable_col="syllable",
+    time_col="time",
+    keep_cols=None,
+):
+    """
+    Segments KPMS data into syllable bouts and summarizes the kinematics of every bout.
 
-        # Compute relative time
-        window_data["relative_time"] = window_data["time"] - closest_time
+    Bouts are runs of consecutive frames with the same syllable within a (cohort_id,
+    day) session. Frame-to-frame steps are computed once on the sorted table and
+    reduced per bout with np.bincount, so all sessions are handled in one pass. The
+    output feeds visualization.create_violin_plot and create_box_strip_plot.
+
+    Parameters:
+        moseq_data (pd.DataFrame): KPMS data with cohort_id, day, time and syllable
+            columns, and optionally centroid_x, centroid_y and heading (radians).
+        syllable_col (str): Column with integer syllable labels (>= 0).
+        time_col (str): Time column (seconds).
+        keep_cols (list, optional): Session-level columns copied from each bout's
+            first frame. Defaults to whichever of 'condition', 'sex', 'young', 'age'
+            and 'source_file' exist.
+
+    Returns:
+        pd.DataFrame: One row per bout with 'cohort_id', 'day', `keep_cols`,
+        'syllable', 'onset' (s), 'n_frames' and 'duration' (s). With centroids:
+        'displacement' (start to end, px), 'distance' (path length, px) and
+        'velocity_px_s_mean'. With heading: 'heading_mean' (circular mean),
+        'heading_change' (net, unwrapped) and 'angular_velocity_mean' (rad/s).
+        Velocities and 'heading_change' are NaN for single-frame bouts.
+    """
+    if keep_cols is None:
+        keep_cols = [
+            col
+            for col in ["condition", "sex", "young", "age", "source_file"]
+            if col in moseq_data.columns
+        ]
 
-        # Keep only relevant columns
-        result_data.append(window_data[selected_columns])
+    order, _, bouts = _syllable_bouts(moseq_data, syllable_col, time_col)
+    starts, n_frames = bouts["start"], bouts["n_frames"]
+    ends = starts + n_frames - 1
+    n_bouts = len(starts)
 
-    # Combine all extracted data into a single DataFrame
-    final_df = (
-        pd.concat(result_data, ignore_index=True)
-        if result_data
-        else pd.DataFrame(columns=selected_columns)
+    result = (
+        moseq_data[["cohort_id", "day"] + list(keep_cols)]
+        .iloc[order[starts]]
+        .reset_index(drop=True)
     )
+    times = moseq_data[time_col].to_numpy(dtype=np.float64)[order]
+    result["syllable"] = bouts["syllable"]
+    result["onset"] = times[starts]
+    result["n_frames"] = n_frames
+    result["duration"] = bouts["duration"]
+
+    # Steps between consecutive frames of the same bout
+    frame_bout = bouts["frame_bout"]
+    within = frame_bout[1:] == frame_bout[:-1]
+    step_bout = frame_bout[1:][within]
+    n_steps = np.bincount(step_bout, minlength=n_bouts)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        step_time = np.diff(times)[within]
+        step_time = np.where(step_time > 0, step_time, np.nan)
+
+        def per_bout_mean(values):
+            return np.where(
+                n_steps > 0,
+                np.bincount(step_bout, weights=values, minlength=n_bouts) / n_steps,
+                np.nan,
+            )
 
-    return final_df
+        if {"centroid_x", "centroid_y"} <= set(moseq_data.columns):
+            x = moseq_data["centroid_x"].to_numpy(dtype=np.float64)[order]
+            y = moseq_data["centroid_y"].to_numpy(dtype=np.float64)[order]
+            step = np.hypot(np.diff(x), np.diff(y))[within]
+            result["displacement"] = np.hypot(x[ends] - x[starts], y[ends] - y[starts])
+            result["distance"] = np.bincount(step_bout, weights=step, minlength=n_bouts)
+            result["velocity_px_s_mean"] = per_bout_mean(step / step_time)
+
+        if "heading" in moseq_data.columns:
+            heading = moseq_data["heading"].to_numpy(dtype=np.float64)[order]
+            result["heading_mean"] = np.arctan2(
+                np.bincount(frame_bout, weights=np.sin(heading), minlength=n_bouts),
+                np.bincount(frame_bout, weights=np.cos(heading), minlength=n_bouts),
+            )
+            # Wrap frame-to-frame turns to [-pi, pi) before summing
+            turn = (np.diff(heading)[within] + np.pi) % (2 * np.pi) - np.pi
+            result["heading_change"] = np.where(
+                n_steps > 0,
+                np.bincount(step_bout, weights=turn, minlength=n_bouts),
+                np.nan,
+            )
+            result["angular_velocity_mean"] = per_bout_mean(turn / step_time)
+
+    return result
+
+
+def _frame_interval(df, time_col="time", by=()):
+    """
+    Median spacing between consecutive frames of the same session.
+    """
+    by = list(by)
+    times = df[time_col].to_numpy(dtype=np.float64)
+    if by:
+        codes = df.groupby(by, sort=False, observed=True).ngroup().to_numpy()
+    else:
+        codes = np.zeros(len(df), dtype=np.int64)
+    order = np.lexsort((times, codes))
+    steps = np.diff(times[order])
+    steps = steps[(np.diff(codes[order]) == 0) & (steps > 0)]
+    return float(np.median(steps)) if len(steps) else 0.0
+
+
+def align_streams(
+    reference_df,
+    other_df,
+    columns,
+    time_col="time",
+    by=("cohort_id", "day"),
+    direction="nearest",
+    tolerance=None,
+):
+    """
+    Resamples columns of one stream onto the time grid of another.
+
+    Every row of `reference_df` is matched, within its session, to the `other_df`
+    frame closest in time (pd.merge_asof), so streams recorded at different frame
+    rates or offsets line up on time rather than on row position.
+
+    Parameters:
+        reference_df (pd.DataFrame): Stream defining the common time grid.
+        other_df (pd.DataFrame): Stream whose `columns` are resampled.
+        columns (str or list): Columns of `other_df` to bring onto the grid.
+        time_col (str): Time column (seconds) present in both tables.
+        by (tuple): Session columns to match within; only those present in both
+            tables are used, so single-session frames need none.
+        direction (str): 'nearest', 'backward' or 'forward' (see pd.merge_asof).
+        tolerance (float, optional): Largest time gap accepted for a match. Defaults
+            to one frame interval of `other_df`; pass np.inf to always match.
+
+    Returns:
+        pd.DataFrame: `reference_df` in its original row order with the resampled
+        `columns` and 'matched_time' (time of the matched `other_df` frame) added.
+        Rows without a match hold NaN.
+    """
+    columns = [columns] if isinstance(columns, str) else list(columns)
+    clashing = [
+        col for col in columns + ["matched_time"] if col in reference_df.columns
+    ]
+    if clashing:
+        raise ValueError(f"Columns {clashing} already exist in reference_df.")
+    by = [col for col in by if col in reference_df.columns and col in other_df.columns]
+    if tolerance is None:
+        tolerance = _frame_interval(other_df, time_col, by)
+
+    left = pd.DataFrame(
+        {
+            "_row": np.arange(len(reference_df)),
+            "_t": reference_df[time_col].to_numpy(dtype=np.float64),
+        }
+    )
+    right = pd.DataFrame(
+        {
+            "_t": other_df[time_col].to_numpy(dtype=np.float64),
+            "matched_time": other_df[time_col].to_numpy(dtype=np.float64),
+        }
+    )
+    for col in by:
+        left[col] = reference_df[col].astype(object).to_numpy()
+        right[col] = other_df[col].astype(object).to_numpy()
+    for col in columns:
+        right[col] = other_df[col].to_numpy()
+
+    merged = pd.merge_asof(
+        left.dropna(subset=["_t"]).sort_values("_t", kind="stable"),
+        right.dropna(subset=["_t"]).sort_values("_t", kind="stable"),
+        on="_t",
+        by=by or None,
+        direction=direction,
+        tolerance=None if np.isinf(tolerance) else tolerance,
+        allow_exact_matches=True,
+    )
+    matched = merged.set_index("_row")[columns + ["matched_time"]].reindex(
+        np.arange(len(reference_df))
+    )
+
+    aligned = reference_df.copy()
+    for col in columns + ["matched_time"]:
+        aligned[col] = matched[col].to_numpy()
+    return aligned
 
 
 def plot_freeze_ethogram(
@@ -222,22 +967,33 @@ def plot_freeze_ethogram(
     - moseq_label: Label for the KPMS data (default is 'KPMS').
     """
 
-    freeze_len = len(freeze_df)
-    moseq_len = len(moseq_df)
-
-    # Align lengths of freeze and moseq data
-    min_length = min(freeze_len, moseq_len)
-    freeze_states = freeze_df[freeze_col].iloc[:min_length]
-    moseq_states = moseq_df[moseq_col].iloc[:min_length]
+    # Restrict both streams to the time range they share
+    min_time = max(freeze_df[time_col].min(), moseq_df[time_col].min())
+    max_time = min(freeze_df[time_col].max(), moseq_df[time_col].max())
+    freeze_df = freeze_df[freeze_df[time_col].between(min_time, max_time)]
+    moseq_df = moseq_df[moseq_df[time_col].between(min_time, max_time)]
 
     # Use actual time values
-    freeze_time = freeze_df[time_col].iloc[:min_length]
-    moseq_time = moseq_df[time_col].iloc[:min_length]
+    freeze_states = freeze_df[freeze_col]
+    moseq_states = moseq_df[moseq_col]
+    freeze_time = freeze_df[time_col]
+    moseq_time = moseq_df[time_col]
+
+    # Score on KPMS states resampled onto the FreezeFrame time grid
+    aligned = align_streams(
+        freeze_df[[time_col, freeze_col]],
+        moseq_df[[time_col, moseq_col]].rename(columns={moseq_col: "_moseq"}),
+        "_moseq",
+        time_col=time_col,
+        by=(),
+    ).dropna(subset=["_moseq"])
 
     # Calculate F1 score & Sensitivity (Recall)
     try:
-        f1 = f1_score(freeze_states, moseq_states, average="binary")
-        sensitivity = recall_score(freeze_states, moseq_states)  # TP / (TP + FN)
+        f1 = f1_score(aligned[freeze_col], aligned["_moseq"], average="binary")
+        sensitivity = recall_score(
+            aligned[freeze_col], aligned["_moseq"]
+        )  # TP / (TP + FN)
     except ValueError as e:
         print(f"Error calculating F1 score or Sensitivity: {e}")
         f1, sensitivity = 0.0, 0.0
@@ -389,6 +1145,170 @@ def plot_freeze_ethogram(
 #         print(f"Average Sensitivity: {sensitivity_total / f1_count:.2f}")
 
 
+def _align_ethogram_sessions(
+    freeze_frame,
+    moseq_data,
+    freeze_col="freeze",
+    moseq_col="moseq_freeze",
+    time_col="time",
+):
+    """
+    Aligns FreezeFrame and KPMS frames of every (cohort_id, day) session in one pass.
+
+    FreezeFrame frames inside the time range both tables cover are the common grid;
+    the KPMS state nearest in time (within one KPMS frame) is matched to each of them
+    with align_streams. Sessions keep the KPMS table's order.
+
+    Returns:
+        pd.DataFrame: One row per aligned frame with 'cohort_id', 'day', 'frame',
+        'freeze_time', 'moseq_time', 'y_true' and 'y_pred', plus 'condition'.
+    """
+    keys = ["cohort_id", "day"]
+    freeze = freeze_frame[
+        keys
+        + [time_col, freeze_col]
+        + (["condition"] if "condition" in freeze_frame.columns else [])
+    ].astype({key: object for key in keys})
+    moseq = moseq_data[keys + [time_col, moseq_col]].astype(
+        {key: object for key in keys}
+    )
+
+    ranges = (
+        moseq.groupby(keys, sort=False)[time_col]
+        .agg(["min", "max"])
+        .join(
+            freeze.groupby(keys, sort=False)[time_col].agg(["min", "max"]),
+            how="inner",
+            lsuffix="_moseq",
+            rsuffix="_freeze",
+        )
+    )
+    ranges["lo"] = ranges[["min_freeze", "min_moseq"]].max(axis=1)
+    ranges["hi"] = ranges[["max_freeze", "max_moseq"]].min(axis=1)
+    ranges = ranges[["lo", "hi"]].reset_index()
+    ranges["session"] = np.arange(len(ranges))
+
+    freeze = ranges.merge(freeze, on=keys, how="inner")
+    freeze = freeze[
+        (freeze[time_col] >= freeze["lo"]) & (freeze[time_col] <= freeze["hi"])
+    ]
+    freeze = freeze.iloc[
+        np.lexsort((freeze[time_col].to_numpy(), freeze["session"].to_numpy()))
+    ]
+
+    aligned = align_streams(
+        freeze.drop(columns=["lo", "hi", "session"]),
+        moseq.rename(columns={moseq_col: "y_pred"}),
+        "y_pred",
+        time_col=time_col,
+        by=keys,
+    ).dropna(subset=["y_pred"])
+    aligned = aligned.rename(
+        columns={
+            time_col: "freeze_time",
+            "matched_time": "moseq_time",
+            freeze_col: "y_true",
+        }
+    )
+    aligned["frame"] = aligned.groupby(keys, sort=False).cumcount()
+    if "condition" not in aligned.columns:
+        aligned["condition"] = "unknown"
+
+    return aligned[
+        keys + ["condition", "frame", "freeze_time", "moseq_time", "y_true", "y_pred"]
+    ].reset_index(drop=True)
+
+
+def _confusion_scores(tp, fp, fn, tn):
+    """
+    F1, sensitivity (recall), precision and Cohen's kappa from confusion count arrays
+    of any shape.
+    """
+    n = tp + fp + fn + tn
+    with np.errstate(invalid="ignore", divide="ignore"):
+        # Undefined scores are 0, matching sklearn's zero_division default
+        f1 = np.where(2 * tp + fp + fn > 0, 2 * tp / (2 * tp + fp + fn), 0.0)
+        recall = np.where(tp + fn > 0, tp / (tp + fn), 0.0)
+        precision = np.where(tp + fp > 0, tp / (tp + fp), 0.0)
+        observed = (tp + tn) / n
+        expected = ((tp + fp) * (tp + fn) + (fn + tn) * (fp + tn)) / n**2
+        kappa = np.where(expected < 1, (observed - expected) / (1 - expected), np.nan)
+    return {
+        "F1 Score": f1,
+        "Sensitivity": recall,
+        "Precision": precision,
+        "Kappa": kappa,
+    }
+
+
+def _score_aligned(aligned):
+    """
+    F1, sensitivity (recall), precision and Cohen's kappa per session from vectorized
+    confusion counts of an aligned frame table.
+    """
+    y_true = aligned["y_true"].to_numpy() == 1
+    y_pred = aligned["y_pred"].to_numpy() == 1
+    counts = aligned[["cohort_id", "day", "condition"]].assign(
+        tp=y_true & y_pred,
+        fp=~y_true & y_pred,
+        fn=y_true & ~y_pred,
+        tn=~y_true & ~y_pred,
+    )
+    counts = (
+        counts.groupby(["cohort_id", "day"], sort=False)
+        .agg(
+            condition=("condition", "first"),
+            tp=("tp", "sum"),
+            fp=("fp", "sum"),
+            fn=("fn", "sum"),
+            tn=("tn", "sum"),
+        )
+        .reset_index()
+    )
+
+    tp, fp, fn, tn = (
+        counts[c].to_numpy(dtype=np.float64) for c in ["tp", "fp", "fn", "tn"]
+    )
+
+    return pd.DataFrame(
+        {
+            "cohort_id": counts["cohort_id"],
+            "day": counts["day"],
+            "condition": counts["condition"],
+            **_confusion_scores(tp, fp, fn, tn),
+            "n_frames": (tp + fp + fn + tn).astype(int),
+        }
+    )
+
+
+def score_ethograms(
+    freeze_frame,
+    moseq_data,
+    freeze_col="freeze",
+    moseq_col="moseq_freeze",
+    time_col="time",
+):
+    """
+    Scores KPMS freeze detection against FreezeFrame for every session, without
+    plotting.
+
+    Parameters:
+    - freeze_frame: DataFrame containing the FreezeFrame data.
+    - moseq_data: DataFrame containing the KPMS data.
+    - freeze_col: Column name in freeze_frame with the freeze states (default 'freeze').
+    - moseq_col: Column name in moseq_data with the freeze states (default 'moseq_freeze').
+    - time_col: Column name representing the time axis in both DataFrames.
+
+    Returns:
+    - DataFrame with cohort_id, day, condition, F1 Score, Sensitivity, Precision,
+      Kappa and n_frames, one row per session present in both tables.
+    """
+    aligned = _align_ethogram_sessions(
+        freeze_frame, moseq_data, freeze_col, moseq_col, time_col
+    )
+    return _score_aligned(aligned)
+
+
 def plot_all_ethograms(
     freeze_frame, moseq_data, plot_func=plot_freeze_ethogram, time_col="time"
 ):
@@ -398,6 +1318,8 @@ def plot_all_ethograms(
     Tracks F1 scores and Sensitivity (recall) for total, 'sefl', and 'control' conditions,
     and returns a DataFrame summarizing the scores.
 
+    Scores come from score_ethograms; use that directly when no figures are needed.
+
     Parameters:
     - freeze_frame: DataFrame containing the FreezeFrame data.
     - moseq_data: DataFrame containing the KPMS data.
@@ -407,46 +1329,26 @@ def plot_all_ethograms(
     Returns:
     - DataFrame with cohort_id, day, condition, F1 score, and Sensitivity.
     """
-
-    matched_ids = moseq_data[["cohort_id", "day"]].drop_duplicates()
-    results = []
-
-    for _, row in matched_ids.iterrows():
-        cohort_id, day = row["cohort_id"], row["day"]
-
-        freeze_subset = freeze_frame[
-            (freeze_frame["cohort_id"] == cohort_id) & (freeze_frame["day"] == day)
-        ].copy()
-        moseq_subset = moseq_data[
-            (moseq_data["cohort_id"] == cohort_id) & (moseq_data["day"] == day)
-        ].copy()
-
-        if freeze_subset.empty or moseq_subset.empty:
-            print(f"Skipping Cohort ID: {cohort_id}, Day: {day} due to empty data.")
-            continue
-
-        if (
-            time_col not in freeze_subset.columns
-            or time_col not in moseq_subset.columns
-        ):
-            print(f"Skipping Cohort ID: {cohort_id}, Day: {day} - Missing time column.")
-            continue
-
-        min_time = max(freeze_subset[time_col].min(), moseq_subset[time_col].min())
-        max_time = min(freeze_subset[time_col].max(), moseq_subset[time_col].max())
-
-        freeze_subset = freeze_subset[
-            (freeze_subset[time_col] >= min_time)
-            & (freeze_subset[time_col] <= max_time)
-        ]
-        moseq_subset = moseq_subset[
-            (moseq_subset[time_col] >= min_time) & (moseq_subset[time_col] <= max_time)
-        ]
-
-        min_length = min(len(freeze_subset), len(moseq_subset))
-        freeze_subset = freeze_subset.iloc[:min_length]
-        moseq_subset = moseq_subset.iloc[:min_length]
-
+    aligned = _align_ethogram_sessions(
+        freeze_frame, moseq_data, "freeze", "moseq_freeze", time_col
+    )
+    results_df = _score_aligned(aligned)
+
+    for (cohort_id, day), session in aligned.groupby(["cohort_id", "day"], sort=False):
+        freeze_subset = pd.DataFrame(
+            {
+                time_col: session["freeze_time"].to_numpy(),
+                "freeze": session["y_true"].to_numpy(),
+                "cohort_id": cohort_id,
+                "day": day,
+            }
+        )
+        moseq_subset = pd.DataFrame(
+            {
+                time_col: session["freeze_time"].to_numpy(),
+                "moseq_freeze": session["y_pred"].to_numpy(),
+            }
+        )
         try:
             plot_func(
                 freeze_df=freeze_subset,
@@ -457,39 +1359,237 @@ def plot_all_ethograms(
                 freeze_label="FreezeFrame",
                 moseq_label="KPMS",
             )
+        except Exception as e:
+            print(f"Error processing Cohort ID: {cohort_id}, Day: {day}. Skipping. {e}")
+            continue
 
-            f1 = f1_score(
-                freeze_subset["freeze"], moseq_subset["moseq_freeze"], average="binary"
-            )
-            sensitivity = recall_score(
-                freeze_subset["freeze"], moseq_subset["moseq_freeze"]
-            )
+        scores = results_df[
+            (results_df["cohort_id"] == cohort_id) & (results_df["day"] == day)
+        ].iloc[0]
+        print(
+            f"Plotted ethogram for Cohort ID: {cohort_id}, Day: {day}, F1 Score: {scores['F1 Score']:.2f}, Sensitivity: {scores['Sensitivity']:.2f}"
+        )
 
-            condition = (
-                freeze_subset["condition"].iloc[0]
-                if "condition" in freeze_subset.columns
-                else "unknown"
-            )
-            results.append(
-                {
-                    "cohort_id": cohort_id,
-                    "day": day,
-                    "condition": condition,
-                    "F1 Score": f1,
-                    "Sensitivity": sensitivity,
-                }
-            )
+    return results_df[["cohort_id", "day", "condition", "F1 Score", "Sensitivity"]]
 
-            print(
-                f"Plotted ethogram for Cohort ID: {cohort_id}, Day: {day}, F1 Score: {f1:.2f}, Sensitivity: {sensitivity:.2f}"
-            )
 
-        except Exception as e:
-            print(f"Error processing Cohort ID: {cohort_id}, Day: {day}. Skipping. {e}")
-            continue
+def _drop_short_runs(state, new_session, times, min_duration, frame_interval=0.0):
+    """
+    Clears runs of True in `state` lasting less than `min_duration` seconds. Runs
+    never continue across rows flagged in `new_session`.
+    """
+    if min_duration <= 0 or not state.any():
+        return state
+    session_end = np.r_[new_session[1:], True]
+    starts = np.flatnonzero(state & (new_session | ~np.r_[False, state[:-1]]))
+    ends = np.flatnonzero(state & (session_end | ~np.r_[state[1:], False]))
+    short = times[ends] - times[starts] + frame_interval < min_duration
+
+    edges = np.zeros(len(state) + 1, dtype=np.int64)
+    edges[starts[short]] += 1
+    edges[ends[short] + 1] -= 1
+    return state & (np.cumsum(edges[:-1]) == 0)
+
+
+def _score_freeze_candidates(
+    tasks, codes, y_true, session, n_sessions, new_session, times, frame_interval
+):
+    """
+    True and false positive counts per session for (membership, min_duration) tasks.
+    """
+    counts = np.empty((len(tasks), 2, n_sessions))
+    for i, (membership, min_duration) in enumerate(tasks):
+        pred = _drop_short_runs(
+            membership[codes], new_session, times, min_duration, frame_interval
+        )
+        counts[i, 0] = np.bincount(session, weights=pred & y_true, minlength=n_sessions)
+        counts[i, 1] = np.bincount(
+            session, weights=pred & ~y_true, minlength=n_sessions
+        )
+    return counts
+
+
+def sweep_freeze_syllables(
+    freeze_frame,
+    moseq_data,
+    candidate_sets,
+    min_durations=(0,),
+    freeze_col="freeze",
+    syllable_col="syllable",
+    time_col="time",
+    n_jobs=1,
+    rank_by="F1 Score",
+):
+    """
+    Scores candidate freeze syllable sets and minimum bout durations against
+    FreezeFrame labels and ranks them.
+
+    Sessions are aligned once (see score_ethograms) and reduced to per-session
+    syllable one-hot counts, so without smoothing each candidate is scored with a
+    single matrix product. Candidates with a minimum duration need the frame
+    sequence and are spread over worker processes.
+
+    Parameters:
+        freeze_frame (pd.DataFrame): FreezeFrame data with cohort_id, day, time and
+            freeze columns.
+        moseq_data (pd.DataFrame): KPMS data with cohort_id, day, time and syllable
+            columns.
+        candidate_sets (list): Iterables of syllables to treat as freezing, e.g.
+            [[2], [0, 2], [0, 2, 4]] or itertools.combinations(range(10), 2).
+        min_durations (iterable): Minimum KPMS freeze bout lengths in seconds;
+            shorter predicted bouts on the aligned FreezeFrame grid are counted as
+            moving (default: (0,), none).
+        freeze_col (str): Freeze column in freeze_frame.
+        syllable_col (str): Syllable column in moseq_data.
+        time_col (str): Time column (seconds) in both tables.
+        n_jobs (int): Number of worker processes for smoothed candidates (default:
+            1, in-process). None uses all cores.
+        rank_by (str): Score column to sort by, best first (default: 'F1 Score').
+
+    Returns:
+        pd.DataFrame: One row per (syllables, min_duration) with pooled F1 Score,
+        Sensitivity, Precision and Kappa over all aligned frames, plus
+        'Mean Session F1', sorted by `rank_by`.
+    """
+    keys = ["cohort_id", "day"]
+    aligned = _align_ethogram_sessions(
+        freeze_frame, moseq_data, freeze_col, syllable_col, time_col
+    )
+    if aligned.empty:
+        raise ValueError("No overlapping sessions between freeze_frame and moseq_data.")
+
+    candidate_sets = [tuple(sorted(set(syllables))) for syllables in candidate_sets]
+    min_durations = list(min_durations)
+    if n_jobs is None:
+        n_jobs = os.cpu_count() or 1
+
+    # Aligned frames are grouped by session and sorted by time
+    session = aligned.groupby(keys, sort=False).ngroup().to_numpy()
+    n_sessions = session.max() + 1
+    new_session = np.r_[True, session[1:] != session[:-1]]
+    codes, syllables = pd.factorize(aligned["y_pred"].astype(np.int64))
+    y_true = aligned["y_true"].to_numpy() == 1
+    times = aligned["freeze_time"].to_numpy(dtype=np.float64)
+    frame_interval = _frame_interval(aligned, "freeze_time", keys)
+
+    n_syllables = len(syllables)
+    membership = np.array(
+        [np.isin(syllables, candidate) for candidate in candidate_sets]
+    ).reshape(len(candidate_sets), n_syllables)
+    n_true = np.bincount(session, weights=y_true, minlength=n_sessions)
+    n_false = np.bincount(session, minlength=n_sessions) - n_true
+
+    # one_hot[s, k, y]: frames of session s with syllable k and FreezeFrame state y
+    one_hot = np.bincount(
+        (session * n_syllables + codes) * 2 + y_true,
+        minlength=n_sessions * n_syllables * 2,
+    ).reshape(n_sessions, n_syllables, 2)
+
+    tp = np.empty((len(candidate_sets), len(min_durations), n_sessions))
+    fp = np.empty_like(tp)
+    tasks = []
+    for j, min_duration in enumerate(min_durations):
+        if min_duration <= 0:
+            tp[:, j] = membership @ one_hot[:, :, 1].T
+            fp[:, j] = membership @ one_hot[:, :, 0].T
+        else:
+            tasks.extend((i, j) for i in range(len(candidate_sets)))
+
+    if tasks:
+        score = partial(
+            _score_freeze_candidates,
+            codes=codes,
+            y_true=y_true,
+            session=session,
+            n_sessions=n_sessions,
+            new_session=new_session,
+            times=times,
+            frame_interval=frame_interval,
+        )
+        n_chunks = max(1, min(n_jobs, len(tasks)))
+        chunks = [tasks[k::n_chunks] for k in range(n_chunks)]
+        payloads = [
+            [(membership[i], min_durations[j]) for i, j in chunk] for chunk in chunks
+        ]
+        if n_chunks == 1:
+            results = [score(payloads[0])]
+        else:
+            with ProcessPoolExecutor(max_workers=n_chunks) as executor:
+                results = list(executor.map(score, payloads))
+        for chunk, counts in zip(chunks, results):
+            rows, cols = np.array(chunk).T
+            tp[rows, cols] = counts[:, 0]
+            fp[rows, cols] = counts[:, 1]
+
+    fn = n_true - tp
+    tn = n_false - fp
+    pooled = _confusion_scores(
+        tp.sum(axis=-1), fp.sum(axis=-1), fn.sum(axis=-1), tn.sum(axis=-1)
+    )
+    per_session_f1 = _confusion_scores(tp, fp, fn, tn)["F1 Score"]
+
+    results_df = pd.DataFrame(
+        {
+            "syllables": [
+                candidate for candidate in candidate_sets for _ in min_durations
+            ],
+            "min_duration": np.tile(min_durations, len(candidate_sets)),
+            **{name: values.ravel() for name, values in pooled.items()},
+            "Mean Session F1": per_session_f1.mean(axis=-1).ravel(),
+        }
+    )
+    if rank_by not in results_df.columns:
+        raise ValueError(f"rank_by must be one of {list(results_df.columns[2:])}.")
+
+    return results_df.sort_values(rank_by, ascending=False, kind="stable").reset_index(
+        drop=True
+    )
+
+
+def assign_moseq_freeze(
+    moseq_data,
+    freeze_syllables,
+    min_duration=0,
+    syllable_col="syllable",
+    time_col="time",
+    freeze_col="moseq_freeze",
+):
+    """
+    Derives the KPMS freeze state from a set of freeze syllables, e.g. the best row of
+    sweep_freeze_syllables.
+
+    Parameters:
+        moseq_data (pd.DataFrame): KPMS data with cohort_id, day, time and syllable
+            columns.
+        freeze_syllables (iterable): Syllables treated as freezing.
+        min_duration (float): Freeze bouts shorter than this many seconds are set to
+            moving (default: 0, no smoothing).
+        syllable_col (str): Syllable column in moseq_data.
+        time_col (str): Time column (seconds) in moseq_data.
+        freeze_col (str): Name of the added column (default: 'moseq_freeze').
+
+    Returns:
+        pd.DataFrame: Copy of moseq_data with the binary `freeze_col` added.
+    """
+    state = moseq_data[syllable_col].isin(list(freeze_syllables)).to_numpy()
+
+    if min_duration > 0:
+        order, _, bounds = _sort_sessions(moseq_data, time_col=time_col)
+        new_session = np.zeros(len(order), dtype=bool)
+        new_session[bounds[:-1]] = True
+        smoothed = _drop_short_runs(
+            state[order],
+            new_session,
+            moseq_data[time_col].to_numpy(dtype=np.float64)[order],
+            min_duration,
+            _frame_interval(moseq_data, time_col, ["cohort_id", "day"]),
+        )
+        state = np.empty_like(state)
+        state[order] = smoothed
 
-    results_df = pd.DataFrame(results)
-    return results_df
+    result = moseq_data.copy()
+    result[freeze_col] = state.astype(int)
+    return result
 
 
 def calculate_syllable_freezing_proportion(
@@ -508,9 +1608,20 @@ def calculate_syllable_freezing_proportion(
     Returns:
     - DataFrame summarizing syllable counts and their freezing association.
     """
-    # Merge MoSeq and FreezeFrame data based on time
-    merged_df = moseq_df[[syllable_col, time_col]].merge(
-        freeze_df[[time_col, freeze_col]], on=time_col, how="left"
+    # Match each KPMS frame to the nearest FreezeFrame frame of its session
+    session_cols = ["cohort_id", "day"]
+    merged_df = align_streams(
+        moseq_df[
+            [syllable_col, time_col]
+            + [col for col in session_cols if col in moseq_df.columns]
+        ],
+        freeze_df[
+            [time_col, freeze_col]
+            + [col for col in session_cols if col in freeze_df.columns]
+        ],
+        freeze_col,
+        time_col=time_col,
+        by=session_cols,
     )
 
     # Ensure freeze_col is binary (0 or 1), treating NaNs as non-freezing (0)
@@ -0,0 +1,103 @@
+"""
+Compact column dtypes for the long-format DLC, MoSeq and FreezeFrame tables.
+
+Identifiers repeated on every row are stored as categoricals, coordinates and latents
+as float32, and syllables / freeze flags as small integers.
+"""
+
+import numpy as np
+import pandas as pd
+
+DLC_SCHEMA = {
+    "x": "float32",
+    "y": "float32",
+    "likelihood": "float32",
+    "cohort_id": "category",
+    "day": "category",
+    "body_part": "category",
+    "index": "int32",
+}
+
+MOSEQ_SCHEMA = {
+    "centroid_x": "float32",
+    "centroid_y": "float32",
+    "heading": "float32",
+    "syllable": "int16",
+    "frame": "int32",
+    "cohort_id": "category",
+    "day": "category",
+}
+
+# dtype of the latent_<i> columns and latent_state arrays
+MOSEQ_LATENT_DTYPE = "float32"
+
+FREEZE_SCHEMA = {
+    "freeze": "int8",
+    "cohort_id": "category",
+    "day": "category",
+}
+
+
+def apply_schema(df, schema, keep_float64=False):
+    """
+    Casts the columns of `df` listed in `schema` to their compact dtype, in place.
+
+    Parameters:
+        df (pd.DataFrame): Table to cast. Columns missing from `df` are ignored, and
+            integer columns holding NaN (e.g. unscored freeze frames) stay float.
+        schema (dict): Mapping of column name to dtype (e.g. DLC_SCHEMA).
+        keep_float64 (bool): If True, float columns are left as float64.
+
+    Returns:
+        pd.DataFrame: The same DataFrame, for chaining.
+    """
+    for col, dtype in schema.items():
+        if col not in df.columns:
+            continue
+        if dtype == "category":
+            if not isinstance(df[col].dtype, pd.CategoricalDtype):
+                df[col] = df[col].astype("category")
+            continue
+        if keep_float64 and np.dtype(dtype).kind == "f":
+            continue
+        if np.dtype(dtype).kind in "iu" and df[col].isna().any():
+            continue
+        if df[col].dtype != dtype:
+            df[col] = df[col].astype(dtype)
+    return df
+
+
+def concat_long_tables(frames):
+    """
+    Concatenates long-format tables in a single pass, keeping categorical columns
+    categorical by taking the union of their categories first.
+
+    Parameters:
+        frames (list): DataFrames with identical columns (e.g. dlc_to_long outputs).
+
+    Returns:
+        pd.DataFrame: All rows, index reset.
+    """
+    frames = [f for f in frames if f is not None]
+    if not frames:
+        return pd.DataFrame()
+
+    cat_cols = [
+        col
+        for col in frames[0].columns
+        if isinstance(frames[0][col].dtype, pd.CategoricalDtype)
+    ]
+    for col in cat_cols:
+        categories = pd.api.types.union_categoricals(
+            [f[col] for f in frames if col in f.columns], ignore_order=True
+        ).categories
+        frames = [
+            (
+                f.assign(**{col: f[col].cat.set_categories(categories)})
+                if col in f.columns
+                else f
+            )
+            for f in frames
+        ]
+
+    return pd.concat(frames, ignore_index=True)